@@ -1,18 +1,26 @@
 import logging
 
-from google.cloud import bigquery
-from pandas_gbq import to_gbq
+import pandas as pd
+from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
 
-from common.auth import get_gcp_credentials
+from common.bq_client import APPEND_PARQUET, get_bq_client, get_bqstorage_client
 from common.config import GOOGLE_CLOUD_PROJECT
 from common.utils import is_trading_hours
 
+# ── Table references ─────────────────────────────────────────────────────────
+GEX_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure"
+# Latest snapshot per symbol/expiry, merged after every append (read by the dashboard)
+GEX_LATEST_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure_latest"
+# Net GEX per expiry × strike for the 3D surface, rebuilt from the latest table
+GEX_SURFACE_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure_surface"
 
-def calculate_and_store_gex():
+
+def calculate_and_store_gex(force: bool = False):
     """
     Calculates net gamma exposure (GEX) for each symbol, expiration_date, and strike,
     then appends only new snapshots into analytics.gamma_exposure. Ensures idempotency by
-    processing only data newer than the last stored timestamp, and runs only during trading hours.
+    processing only data newer than the last stored timestamp, and runs only during trading hours
+    (force=True skips that check, for a caller that already made it for this run).
 
     Columns loaded:
       - symbol (e.g. 'SPX')
@@ -24,28 +32,30 @@ def calculate_and_store_gex():
     """
     try:
         # 1) Skip processing outside market hours
-        if not is_trading_hours():
+        if not force and not is_trading_hours():
             logging.info("⏳ Market closed, skipping calculate_and_store_gex.")
             return
 
-        # 2) Initialize BigQuery client
-        credentials = get_gcp_credentials()
-        client = bigquery.Client(credentials=credentials, project=GOOGLE_CLOUD_PROJECT)
+        # 2) Reuse the shared BigQuery client
+        client = get_bq_client()
 
         # 3) Determine last processed timestamp to avoid duplicates
         max_ts_sql = f"""
         SELECT
           MAX(timestamp) AS last_ts
-        FROM `{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure`
+        FROM `{GEX_TABLE}`
         """
-        last_ts_df = client.query(max_ts_sql).to_dataframe()
+        last_ts_df = client.query_and_wait(max_ts_sql).to_dataframe()
         last_ts = last_ts_df.loc[0, "last_ts"] if not last_ts_df.empty else None
 
         # Build a filter clause if we have already processed data
-        snapshot_filter = ""
-        if last_ts is not None:
+        # (QUALIFY below requires a WHERE clause, hence the TRUE default)
+        snapshot_filter = "WHERE TRUE"
+        params = []
+        if last_ts is not None and pd.notna(last_ts):
             # Only include snapshots after the last processed timestamp
-            snapshot_filter = f"WHERE a.timestamp > TIMESTAMP('{last_ts.isoformat()}')"
+            snapshot_filter = "WHERE a.timestamp > @last_ts"
+            params.append(ScalarQueryParameter("last_ts", "TIMESTAMP", last_ts.to_pydatetime()))
 
         # 4) Calculate net gamma exposure from the latest option_chain_snapshot per symbol/expiry
         query = f"""
@@ -53,37 +63,40 @@ def calculate_and_store_gex():
           SELECT
             a.symbol,
             a.expiration_date,
-            MAX(a.timestamp) AS ts
+            a.strike,
+            a.timestamp,
+            a.underlying_price,
+            a.option_type,
+            a.gamma,
+            a.open_interest
           FROM `{GOOGLE_CLOUD_PROJECT}.options.option_chain_snapshot` a
           {snapshot_filter}
-          GROUP BY a.symbol, a.expiration_date
+          QUALIFY a.timestamp = MAX(a.timestamp) OVER (PARTITION BY a.symbol, a.expiration_date)
         )
         SELECT
-          a.symbol,
-          a.expiration_date,
-          a.strike,
-          l.ts          AS timestamp,
-          a.underlying_price,
+          symbol,
+          expiration_date,
+          strike,
+          timestamp,
+          underlying_price,
           SUM(
-            CASE WHEN a.option_type = 'put' THEN -1 ELSE 1 END
-            * a.gamma
-            * a.open_interest
+            CASE WHEN option_type = 'put' THEN -1 ELSE 1 END
+            * gamma
+            * open_interest
             * 100
           ) AS net_gamma_exposure
-        FROM `{GOOGLE_CLOUD_PROJECT}.options.option_chain_snapshot` a
-        JOIN latest l
-          ON a.symbol = l.symbol
-         AND a.expiration_date = l.expiration_date
-         AND a.timestamp = l.ts
+        FROM latest
         GROUP BY
-          a.symbol, 
-          a.expiration_date, 
-          a.strike, 
-          l.ts, 
-          a.underlying_price
+          symbol,
+          expiration_date,
+          strike,
+          timestamp,
+          underlying_price
         """
 
-        df = client.query(query).to_dataframe()
+        df = client.query_and_wait(
+            query, job_config=QueryJobConfig(query_parameters=params)
+        ).to_dataframe(bqstorage_client=get_bqstorage_client())
 
         # 5) If no new rows, skip upload
         if df.empty:
@@ -91,15 +104,87 @@ def calculate_and_store_gex():
             return
 
         # 6) Append to analytics.gamma_exposure
-        table_id = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure"
-        logging.info(f"✅ Uploading {len(df)} new GEX rows to {table_id}")
-        to_gbq(
-            df,
-            table_id,
-            project_id=GOOGLE_CLOUD_PROJECT,
-            if_exists="append",
-            credentials=credentials,
-        )
+        logging.info(f"✅ Uploading {len(df)} new GEX rows to {GEX_TABLE}")
+        client.load_table_from_dataframe(df, GEX_TABLE, job_config=APPEND_PARQUET).result()
+
+        # 7) Merge this snapshot into the latest roll-up, then rebuild the surface from it,
+        #    so dashboard reads stay tiny
+        refresh_latest_gamma_exposure(client, since=df["timestamp"].min().to_pydatetime())
+        refresh_gamma_exposure_surface(client)
 
     except Exception as e:
         logging.exception(f"💥 Error in calculate_and_store_gex: {e}")
+
+
+def refresh_latest_gamma_exposure(client, since):
+    """
+    Folds the snapshot just appended to analytics.gamma_exposure (every row at or
+    after `since`) into analytics.gamma_exposure_latest, keyed by symbol,
+    expiration_date and strike, and drops expired expiries. The source scan is
+    bounded to those new rows (gamma_exposure is partitioned by DATE(timestamp)),
+    so the cost stays flat as the history grows. The dashboard reads this small
+    table instead of re-deriving the latest snapshot from the full history.
+
+    Strikes that drop out of an expiry's chain keep their older timestamp; readers
+    already keep only the newest timestamp per expiry.
+    """
+    sql = f"""
+    CREATE TABLE IF NOT EXISTS `{GEX_LATEST_TABLE}`
+    CLUSTER BY expiration_date
+    AS
+    SELECT symbol, expiration_date, strike, timestamp, underlying_price, net_gamma_exposure
+    FROM `{GEX_TABLE}`
+    WHERE FALSE;
+
+    MERGE `{GEX_LATEST_TABLE}` T
+    USING (
+      SELECT symbol, expiration_date, strike, timestamp, underlying_price, net_gamma_exposure
+      FROM `{GEX_TABLE}`
+      WHERE timestamp >= @since
+        AND expiration_date >= CURRENT_DATE()
+    ) S
+    ON T.symbol = S.symbol
+      AND T.expiration_date = S.expiration_date
+      AND T.strike = S.strike
+    WHEN MATCHED THEN UPDATE SET
+      timestamp          = S.timestamp,
+      underlying_price   = S.underlying_price,
+      net_gamma_exposure = S.net_gamma_exposure
+    WHEN NOT MATCHED THEN INSERT ROW
+    WHEN NOT MATCHED BY SOURCE AND T.expiration_date < CURRENT_DATE() THEN DELETE
+    """
+    client.query_and_wait(
+        sql,
+        job_config=QueryJobConfig(
+            query_parameters=[ScalarQueryParameter("since", "TIMESTAMP", since)]
+        ),
+    )
+    logging.info(f"✅ Refreshed {GEX_LATEST_TABLE}")
+
+
+def refresh_gamma_exposure_surface(client):
+    """
+    Rebuilds analytics.gamma_exposure_surface: net gamma exposure summed per
+    expiration_date and strike over the latest snapshot of each expiry. The
+    dashboard's 3D surface reads it directly, with no aggregation left to do.
+    Must run after refresh_latest_gamma_exposure.
+    """
+    sql = f"""
+    CREATE OR REPLACE TABLE `{GEX_SURFACE_TABLE}`
+    CLUSTER BY expiration_date
+    AS
+    WITH latest_per_expiry AS (
+      SELECT expiration_date, strike, net_gamma_exposure
+      FROM `{GEX_LATEST_TABLE}`
+      WHERE TRUE
+      QUALIFY timestamp = MAX(timestamp) OVER (PARTITION BY expiration_date)
+    )
+    SELECT
+      expiration_date,
+      strike,
+      SUM(net_gamma_exposure) AS gex
+    FROM latest_per_expiry
+    GROUP BY expiration_date, strike
+    """
+    client.query_and_wait(sql)
+    logging.info(f"✅ Refreshed {GEX_SURFACE_TABLE}")
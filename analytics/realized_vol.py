@@ -7,36 +7,38 @@ import logging
 
 import numpy as np
 import pandas as pd
-from google.cloud import bigquery
-from pandas_gbq import to_gbq
 
-from common.auth import get_gcp_credentials
+from common.bq_client import APPEND_PARQUET, get_bq_client, get_bqstorage_client
 from common.config import GOOGLE_CLOUD_PROJECT
 from common.utils import is_trading_hours
 
 
-def calculate_and_store_realized_vol():
+def calculate_and_store_realized_vol(force: bool = False):
+    # force=True skips the market-hours check, for a caller that already made it for this run
     try:
-        if not is_trading_hours():
+        if not force and not is_trading_hours():
             logging.info("⏳ Market closed, skipping calculate_and_store_realized_vol.")
             return
 
-        credentials = get_gcp_credentials()
-        client = bigquery.Client(credentials=credentials, project=GOOGLE_CLOUD_PROJECT)
+        client = get_bq_client()
 
         query = f"""
-        SELECT *
+        SELECT symbol, timestamp, last
         FROM `{GOOGLE_CLOUD_PROJECT}.market_data.index_price_snapshot`
         WHERE timestamp >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 2 DAY)
         ORDER BY symbol, timestamp
         """
-        df = client.query(query).to_dataframe()
+        df = client.query_and_wait(query).to_dataframe(bqstorage_client=get_bqstorage_client())
         if df.empty:
             logging.warning("⚠️ No data found in index_price_snapshot. Exiting.")
             return
 
+        # Few distinct symbols → categorical keys, so groupby works on int codes;
+        # rows already arrive ordered by symbol, so skip the key sort as well
+        df = df.astype({"symbol": "category"})
+
         results = []
-        for symbol, group in df.groupby("symbol"):
+        for symbol, group in df.groupby("symbol", sort=False, observed=True):
             group["timestamp"] = pd.to_datetime(group["timestamp"], utc=True)
             group = group.sort_values("timestamp")
 
@@ -73,13 +75,7 @@ def calculate_and_store_realized_vol():
             vol_df["timestamp"] = pd.to_datetime(vol_df["timestamp"], utc=True)
             logging.info(f"📤 Uploading {len(vol_df)} realized volatility rows to BigQuery...")
             table_id = f"{GOOGLE_CLOUD_PROJECT}.analytics.realized_volatility"
-            to_gbq(
-                vol_df,
-                table_id,
-                project_id=GOOGLE_CLOUD_PROJECT,
-                if_exists="append",
-                credentials=credentials,
-            )
+            client.load_table_from_dataframe(vol_df, table_id, job_config=APPEND_PARQUET).result()
         else:
             logging.info("📭 No volatility records to upload.")
 
@@ -0,0 +1,77 @@
+# =====================
+# common/bq_client.py
+# Process-wide BigQuery clients, built lazily (on first use) from the shared credentials
+# =====================
+import itertools
+from functools import lru_cache
+from typing import Iterator
+
+from google.cloud import bigquery
+from google.cloud.bigquery_storage import BigQueryReadClient
+from google.cloud.bigquery_storage_v1.services.big_query_read.transports import (
+    BigQueryReadGrpcTransport,
+)
+
+from common.auth import get_gcp_credentials
+from common.config import GOOGLE_CLOUD_PROJECT
+
+# Storage Read API clients (separate connections) handed out round-robin
+BQSTORAGE_POOL_SIZE = 4
+
+# Append a DataFrame as one Parquet (Arrow-serialized) load job
+APPEND_PARQUET = bigquery.LoadJobConfig(
+    source_format=bigquery.SourceFormat.PARQUET,
+    write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+)
+
+
+@lru_cache(maxsize=1)
+def get_bq_client() -> bigquery.Client:
+    """
+    Returns the shared BigQuery client.
+
+    The client (and its HTTP connection pool) is created on first use and
+    reused by every caller in the process. Queries request the 24 h results
+    cache by default, so repeated read-only queries can be served for free.
+    """
+    return bigquery.Client(
+        credentials=get_gcp_credentials(),
+        project=GOOGLE_CLOUD_PROJECT,
+        default_query_job_config=bigquery.QueryJobConfig(use_query_cache=True),
+    )
+
+
+@lru_cache(maxsize=1)
+def _bqstorage_pool() -> Iterator[BigQueryReadClient]:
+    """
+    Builds BQSTORAGE_POOL_SIZE Storage Read API clients, each on its own gRPC
+    connection, and cycles through them. use_local_subchannel_pool stops gRPC
+    from quietly sharing one connection between identically-configured channels.
+    """
+    clients = [
+        BigQueryReadClient(
+            transport=BigQueryReadGrpcTransport(
+                channel=BigQueryReadGrpcTransport.create_channel(
+                    credentials=get_gcp_credentials(),
+                    options=[
+                        ("grpc.use_local_subchannel_pool", 1),
+                        ("grpc.max_send_message_length", -1),
+                        ("grpc.max_receive_message_length", -1),
+                    ],
+                )
+            )
+        )
+        for _ in range(BQSTORAGE_POOL_SIZE)
+    ]
+    return itertools.cycle(clients)
+
+
+def get_bqstorage_client() -> BigQueryReadClient:
+    """
+    Returns a shared BigQuery Storage Read API client (round-robin over a small pool).
+
+    Pass it as to_dataframe(bqstorage_client=...) for large results: rows arrive as
+    Arrow record batches instead of JSON pages, concurrent downloads don't all queue
+    behind one HTTP/2 connection, and no throwaway read client is created per call.
+    """
+    return next(_bqstorage_pool())
@@ -16,6 +16,7 @@ GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 BASE_URL = "https://api.tradier.com/v1/markets"
 CONTRACT_MULTIPLIER = 100
 FETCH_INTERVAL_MIN = 10
+MAX_CHAIN_EXPIRATIONS = 10  # upcoming expiries whose option chains are fetched per symbol
 GEX_INTERVAL_MIN = 15
 SUPPORTED_SYMBOLS = ["SPX"]
 SPX = "SPX"
@@ -24,6 +25,7 @@ INDEX_PRICE_TIME_INTERVAL = "5m"
 MODEL_VERSION = "v0.1"
 TARGET_DELTA = 0.1
 WING_WIDTH = 10
+DASHBOARD_MAX_BYTES_BILLED = 10 * 2**30  # 10 GiB cap per dashboard query
 
 # Sanity checks (optional but helpful for debugging)
 REQUIRED_VARS = {
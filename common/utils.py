@@ -5,8 +5,11 @@
 import logging
 import os
 from datetime import datetime, time
+from functools import lru_cache
+from time import time as epoch_seconds
+from zoneinfo import ZoneInfo
 
-import pytz
+EASTERN = ZoneInfo("America/New_York")
 
 
 def setup_logging():
@@ -30,12 +33,20 @@ def is_trading_hours() -> bool:
     """
     True from 9:30 AM through 4:00 PM Eastern, Mon–Fri,
     excluding U.S. federal holidays.
+
+    Evaluated once per wall-clock minute; the scheduled jobs that fire on the
+    same tick share the cached answer.
     """
-    now = datetime.now(pytz.timezone("US/Eastern"))
+    return _trading_hours_at(int(epoch_seconds() // 60))
+
+
+@lru_cache(maxsize=1)
+def _trading_hours_at(epoch_minute: int) -> bool:
+    now = datetime.fromtimestamp(epoch_minute * 60, EASTERN)
 
     # 1) Mon–Fri only
     if now.weekday() >= 5:
         return False
 
-    # 3) Market open/close inclusive
-    return time(9, 30) <= now.time() <= time(16, 1)  # allow up to 16:00:59
+    # 3) Market open/close inclusive (minute resolution, so 16:00 covers up to 16:00:59)
+    return time(9, 30) <= now.time() <= time(16, 0)
@@ -8,6 +8,7 @@ import sys
 from datetime import date, datetime, timedelta
 from pathlib import Path
 
+import numpy as np  # vectorized aggregation
 import pandas as pd  # data manipulation
 
 # Third-party imports
@@ -17,9 +18,11 @@ from dash import (  # Dash framework components
     Dash,
     Input,
     Output,
+    Patch,
     callback_context,
     dcc,
     html,
+    no_update,
 )
 from flask_caching import Cache  # server-side caching
 from plotly.graph_objects import Bar, Figure  # Plotly charting primitives
@@ -49,10 +52,8 @@ from utils.bq_queries import (
     get_gamma_exposure_for_expiry,
     get_gamma_exposure_surface_data,
     get_historical_expirations,
-    get_legs_data,
-    get_live_pnl_data,
+    get_trade_bundle,
     get_trade_ids,
-    get_trade_pl_analysis,
     get_trade_recommendations,
 )
 
@@ -67,24 +68,32 @@ cache = Cache(app.server, config={"CACHE_TYPE": "SimpleCache"})
 # ==============================================================================
 # Memoized Fetchers
 # ==============================================================================
-@cache.memoize(timeout=CACHE_TIMEOUT)
+# The getters return [] on a failed query; response_filter=bool keeps such empty
+# results out of the cache so the next callback retries instead of waiting out the TTL.
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=bool)
 def _expirations():
     """Returns list of upcoming expirations (YYYY-MM-DD)."""
     return list(reversed(get_available_expirations()))
 
 
-@cache.memoize(timeout=CACHE_TIMEOUT)
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=bool)
 def _trade_ids():
     """Returns all known trade IDs for MATCH callbacks."""
     return get_trade_ids()
 
 
-@cache.memoize(timeout=CACHE_TIMEOUT)
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=bool)
 def _hist_expirations():
     """Returns list of past expirations (YYYY‑MM‑DD)."""
     return get_historical_expirations(limit=100)
 
 
+@cache.memoize(timeout=CACHE_TIMEOUT, response_filter=lambda result: not result[0].empty)
+def _gex_for_expiry(exp_date):
+    """Returns (per-strike GEX DataFrame, spot) for one expiry, cached per expiry."""
+    return get_gamma_exposure_for_expiry(exp_date)
+
+
 # ==============================================================================
 # App Layout
 # ==============================================================================
@@ -161,6 +170,9 @@ def _update_surface(n_clicks, start_date, end_date):
     """
     Refresh the 3D surface based on user-selected start/end expiration dates.
     """
+    # Half-cleared date range: keep the current surface instead of querying
+    if not start_date or not end_date:
+        return no_update
     try:
         fig = get_gamma_exposure_surface_data(start_date=start_date, end_date=end_date)
         return fig
@@ -168,6 +180,39 @@ def _update_surface(n_clicks, start_date, end_date):
         return Figure(layout={"title": f"Error loading surface: {e}"})
 
 
+# --------------------------------
+# Bar Chart Helpers
+# --------------------------------
+def _bar_figure(names, title, height):
+    """
+    Empty bar-chart skeleton rendered once at layout time; callbacks then
+    patch the trace data in place instead of replacing the whole figure.
+    """
+    fig = Figure()
+    for name in names:
+        fig.add_trace(Bar(x=[], y=[], name=name))
+    fig.update_layout(
+        title=title,
+        xaxis_title="Strike",
+        yaxis_title="Net Gamma Exposure",
+        template="plotly_white",
+        height=height,
+    )
+    return fig
+
+
+def _clear_bars(fig, n_traces, title):
+    """
+    Empty every bar trace and reference line of a patched figure and show `title`.
+    """
+    for i in range(n_traces):
+        fig["data"][i]["x"] = []
+        fig["data"][i]["y"] = []
+    fig["layout"]["shapes"] = []
+    fig["layout"]["title"]["text"] = title
+    return fig
+
+
 # --------------------------------
 # Gamma Analysis Tab
 # --------------------------------
@@ -185,7 +230,12 @@ def _gamma_analysis_tab():
                 clearable=False,
                 style={"width": "50%", "marginBottom": "1rem"},
             ),
-            dcc.Loading(dcc.Graph(id="gamma-exposure-chart"), type="default"),
+            dcc.Graph(
+                id="gamma-exposure-chart",
+                figure=_bar_figure(
+                    ["Positive GEX", "Negative GEX"], "Select an expiration date", 450
+                ),
+            ),
         ]
     )
 
@@ -193,63 +243,56 @@ def _gamma_analysis_tab():
 @app.callback(
     Output("gamma-exposure-chart", "figure"),
     Input("gamma-expiry-dropdown", "value"),
+    prevent_initial_call=True,  # skeleton already prompts for an expiry
 )
 def _update_gamma_chart(exp_date):
     """
-    Produce bar chart of net gamma exposure for the selected expiration.
+    Patch the bar chart of net gamma exposure for the selected expiration.
     """
+    fig = Patch()
     if not exp_date:
-        return Figure(layout={"title": "Select an expiration date"})
+        return _clear_bars(fig, 2, "Select an expiration date")
     try:
-        df, spot = get_gamma_exposure_for_expiry(exp_date)
+        df, spot = _gex_for_expiry(exp_date)
     except Exception as e:
-        return Figure(layout={"title": f"Error fetching data: {str(e)}"})
+        return _clear_bars(fig, 2, f"Error fetching data: {str(e)}")
 
     if df.empty:
-        return Figure(layout={"title": f"No data for {exp_date}"})
+        return _clear_bars(fig, 2, f"No data for {exp_date}")
 
-    fig = Figure()
     # Positive and negative bars for clarity
-    fig.add_trace(
-        Bar(
-            x=df[df.net_gamma_exposure >= 0]["strike"],
-            y=df[df.net_gamma_exposure >= 0]["net_gamma_exposure"],
-            name="Positive GEX",
-        )
-    )
-    fig.add_trace(
-        Bar(
-            x=df[df.net_gamma_exposure < 0]["strike"],
-            y=df[df.net_gamma_exposure < 0]["net_gamma_exposure"],
-            name="Negative GEX",
+    pos = df[df.net_gamma_exposure >= 0]
+    neg = df[df.net_gamma_exposure < 0]
+    fig["data"][0]["x"] = pos["strike"]
+    fig["data"][0]["y"] = pos["net_gamma_exposure"]
+    fig["data"][1]["x"] = neg["strike"]
+    fig["data"][1]["y"] = neg["net_gamma_exposure"]
+
+    # Zero-exposure line, plus spot price reference line when available
+    shapes = [
+        dict(
+            type="line",
+            x0=df.strike.min(),
+            x1=df.strike.max(),
+            y0=0,
+            y1=0,
+            line=dict(color="gray", dash="dot"),
         )
-    )
-    # Spot price reference line
+    ]
     if spot is not None:
-        fig.add_shape(
-            type="line",
-            x0=spot,
-            x1=spot,
-            y0=df.net_gamma_exposure.min(),
-            y1=df.net_gamma_exposure.max(),
-            line=dict(color="black", dash="dash"),
+        shapes.insert(
+            0,
+            dict(
+                type="line",
+                x0=spot,
+                x1=spot,
+                y0=df.net_gamma_exposure.min(),
+                y1=df.net_gamma_exposure.max(),
+                line=dict(color="black", dash="dash"),
+            ),
         )
-    # Zero-exposure line
-    fig.add_shape(
-        type="line",
-        x0=df.strike.min(),
-        x1=df.strike.max(),
-        y0=0,
-        y1=0,
-        line=dict(color="gray", dash="dot"),
-    )
-    fig.update_layout(
-        title=f"GEX on {exp_date}" + (f" | Spot≈{spot:.2f}" if spot else ""),
-        xaxis_title="Strike",
-        yaxis_title="Net Gamma Exposure",
-        template="plotly_white",
-        height=450,
-    )
+    fig["layout"]["shapes"] = shapes
+    fig["layout"]["title"]["text"] = f"GEX on {exp_date}" + (f" | Spot≈{spot:.2f}" if spot else "")
     return fig
 
 
@@ -290,26 +333,31 @@ def _update_trade_table(status_filter):
     if df.empty:
         return html.Div("No trades found.", style={"textAlign": "center", "marginTop": "2rem"})
 
+    # Pre-format every display string column-wise before building rows
+    entry = pd.to_datetime(df["entry_time"])
+    if entry.dt.tz is None:
+        entry = entry.dt.tz_localize(pytz.utc)
+    closed = (df["status"] == "closed").to_numpy()
+    amount = np.where(closed, df["exit_price"], df["pnl"]).astype(float)
+    df = df.assign(
+        id_s="ID: " + df["trade_id"].astype(str),
+        strategy_s="Strategy: " + df["strategy_type"].astype(str),
+        status_s="Status: " + df["status"].astype(str),
+        entry_s="Entry: " + entry.dt.tz_convert(EAST_TZ).dt.strftime("%Y-%m-%d %H:%M") + " EST",
+        amount_s=np.char.add(np.where(closed, "Exit: $", "PnL: $"), np.char.mod("%.2f", amount)),
+    )
+
     rows = []
     # Iterate each trade record
-    for _, r in df.iterrows():
-        # Convert entry_time to EST string
-        dt = pd.to_datetime(r.entry_time)
-        if dt.tzinfo is None:
-            dt = pytz.utc.localize(dt)
-        dt_est = dt.astimezone(EAST_TZ)
-        entry_str = dt_est.strftime("%Y-%m-%d %H:%M") + " EST"
-
+    for r in df.itertuples(index=False):
         # Main row components
         main = html.Div(
             [
-                html.Div(f"ID: {r.trade_id}", className="trade-id"),
-                html.Div(f"Strategy: {r.strategy_type}"),
-                html.Div(f"Status: {r.status}"),
-                html.Div(f"Entry: {entry_str}"),
-                html.Div(
-                    f"{'Exit:' if r.status=='closed' else 'PnL:'} ${(r.exit_price if r.status=='closed' else r.pnl):.2f}"
-                ),
+                html.Div(r.id_s, className="trade-id"),
+                html.Div(r.strategy_s),
+                html.Div(r.status_s),
+                html.Div(r.entry_s),
+                html.Div(r.amount_s),
                 # Expand/Collapse button, tracked by MATCH callback
                 html.Button(
                     "Expand",
@@ -328,35 +376,53 @@ def _update_trade_table(status_filter):
             className="collapse-content",
         )
 
+        # Fires the server-side detail load each time the panel is opened
+        request = dcc.Store(id={"type": "details-request", "index": r.trade_id})
+
         # Wrap main + collapse in one row
-        rows.append(html.Div([main, collapse], className="trade-row"))
+        rows.append(html.Div([main, collapse, request], className="trade-row"))
 
     return html.Div(rows, className="trade-table")
 
 
-@app.callback(
-    # Update the style + contents of the collapse div, and button label
+# Toggle visibility of the detail panel and the button label in the browser;
+# only opening the panel goes to the server, to (re)load its live marks.
+app.clientside_callback(
+    """
+    function(n_clicks) {
+        var isOpen = (n_clicks || 0) % 2 === 1;  // odd clicks -> open
+        return [
+            {display: isOpen ? "block" : "none"},
+            isOpen ? "Collapse" : "Expand",
+            isOpen ? n_clicks : window.dash_clientside.no_update
+        ];
+    }
+    """,
     Output({"type": "collapse-content", "index": MATCH}, "style"),
-    Output({"type": "collapse-content", "index": MATCH}, "children"),
     Output({"type": "expand-button", "index": MATCH}, "children"),
+    Output({"type": "details-request", "index": MATCH}, "data"),
     Input({"type": "expand-button", "index": MATCH}, "n_clicks"),
+    prevent_initial_call=True,
 )
-def _toggle_details(n_clicks):
+
+
+@app.callback(
+    Output({"type": "collapse-content", "index": MATCH}, "children"),
+    Input({"type": "details-request", "index": MATCH}, "data"),
+    prevent_initial_call=True,
+)
+def _load_details(_):
     """
-    Toggle visibility of the detail panel and update button label accordingly.
+    Fill the detail panel with P/L analysis and current leg data each time it is opened.
     """
-    is_open = (n_clicks or 0) % 2 == 1  # odd clicks -> open
-    btn_label = "Collapse" if is_open else "Expand"
-    if not is_open:
-        return {"display": "none"}, [], btn_label
-
     # Identify which trade id triggered the callback
     tid = callback_context.triggered_id["index"]
 
-    # Fetch P/L analysis and leg data
-    pl = get_trade_pl_analysis(tid).iloc[0]
-    legs = get_legs_data(tid)
-    live = get_live_pnl_data(tid)
+    # Fetch P/L analysis, leg data and live PnL in one batched round-trip
+    bundle = get_trade_bundle([tid])[tid]
+    pl = bundle["pl_analysis"].iloc[0]
+    legs = bundle["legs"]
+    live = bundle["live_pnl"]
 
     # Merge to combine static and live PnL
     merged = legs.merge(
@@ -364,13 +430,8 @@ def _toggle_details(n_clicks):
     )
 
     # Compute total current PnL (closed uses stored pnl, open uses theoretical)
-    total_pnl = (
-        merged.apply(
-            lambda row: row.pnl if row.status == "closed" else row.theoretical_pnl,
-            axis=1,
-        ).sum()
-        * 100
-    )
+    closed = (merged["status"] == "closed").to_numpy()
+    total_pnl = np.nansum(np.where(closed, merged["pnl"], merged["theoretical_pnl"])) * 100
 
     # Build HTML table for each leg
     header = html.Tr(
@@ -407,7 +468,7 @@ def _toggle_details(n_clicks):
         table,
     ]
 
-    return {"display": "block"}, details, btn_label
+    return details
 
 
 # --------------------------------
@@ -450,8 +511,11 @@ def _gamma_intraday_tab():
                     "marginBottom": "1rem",
                 },
             ),
-            # Graph placeholder
-            dcc.Loading(dcc.Graph(id="intraday-gamma-chart"), type="default"),
+            # Graph skeleton, patched in place by the callback
+            dcc.Graph(
+                id="intraday-gamma-chart",
+                figure=_bar_figure(["Net GEX"], "Select expiration and time (EST)", 500),
+            ),
         ]
     )
 
@@ -461,6 +525,7 @@ def _gamma_intraday_tab():
     Input("refresh-intraday", "n_clicks"),
     Input("intraday-expiry-dropdown", "value"),
     Input("intraday-time-input", "value"),
+    prevent_initial_call=True,  # skeleton already prompts for expiry/time
 )
 def _update_intraday_chart(n_clicks, expiry, time_str):
     """
@@ -468,12 +533,13 @@ def _update_intraday_chart(n_clicks, expiry, time_str):
       1) Parse the EST time string
       2) Convert to UTC TIMESTAMP literal
       3) Query get_gamma_exposure_at_time() ±5 min
-      4) Aggregate net GEX by strike
-      5) Draw a single Bar trace, red bars for negative GEX
+      4) Read the per-strike net GEX (summed in SQL)
+      5) Patch the single Bar trace, red bars for negative GEX
     """
+    fig = Patch()
     # 1) Validate inputs: need both expiry and a time
     if not expiry or not time_str:
-        return Figure(layout={"title": "Select expiration and time (EST)"})
+        return _clear_bars(fig, 1, "Select expiration and time (EST)")
 
     try:
         # 2) Parse input EST ↦ aware datetime
@@ -492,50 +558,40 @@ def _update_intraday_chart(n_clicks, expiry, time_str):
 
         # 6) If no data, show friendly message
         if df.empty:
-            return Figure(layout={"title": f"No data around {time_str} EST"})
+            return _clear_bars(fig, 1, f"No data around {time_str} EST")
 
-        # 7) Aggregate (in case multiple rows per strike)
-        df_net = (
-            df.groupby("strike", as_index=False)["net_gamma_exposure"].sum().sort_values("strike")
-        )
+        # 7) Already summed per strike and sorted by BigQuery
+        strikes = df["strike"].to_numpy()
+        net = df["net_gamma_exposure"].to_numpy()
 
         # 8) Build the bar colors: red if negative, else blue
-        bar_colors = ["red" if g < 0 else "steelblue" for g in df_net["net_gamma_exposure"]]
-
-        # 9) Create the bar chart
-        fig = Figure()
-        fig.add_trace(
-            Bar(
-                x=df_net["strike"],
-                y=df_net["net_gamma_exposure"],
-                name="Net GEX",
-                marker=dict(color=bar_colors),
-            )
-        )
+        bar_colors = np.where(net < 0, "red", "steelblue")
+
+        # 9) Update the bar trace in place
+        fig["data"][0]["x"] = strikes
+        fig["data"][0]["y"] = net
+        fig["data"][0]["marker"]["color"] = bar_colors
 
         # 10) Draw a horizontal zero line for reference
-        fig.add_shape(
-            type="line",
-            x0=df_net.strike.min(),
-            x1=df_net.strike.max(),
-            y0=0,
-            y1=0,
-            line=dict(color="gray", dash="dot"),
-        )
+        fig["layout"]["shapes"] = [
+            dict(
+                type="line",
+                x0=strikes[0],
+                x1=strikes[-1],
+                y0=0,
+                y1=0,
+                line=dict(color="gray", dash="dot"),
+            )
+        ]
 
         # 11) Final layout touches
-        fig.update_layout(
-            title=(f"Intraday Net GEX on {expiry} at {dt_est.strftime('%H:%M')} ET (±5 min)"),
-            xaxis_title="Strike",
-            yaxis_title="Net Gamma Exposure",
-            template="plotly_white",
-            height=500,
-        )
+        title = f"Intraday Net GEX on {expiry} at {dt_est.strftime('%H:%M')} ET (±5 min)"
+        fig["layout"]["title"]["text"] = title
         return fig
 
     except Exception as e:
         logging.error(f"Error in intraday chart callback: {e}")
-        return Figure(layout={"title": f"Error: {e}"})
+        return _clear_bars(fig, 1, f"Error: {e}")
 
 
 # ==============================================================================
@@ -4,27 +4,121 @@
 # =====================
 
 import logging
-from typing import List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-from google.cloud import bigquery
-from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud.bigquery import (
+    ArrayQueryParameter,
+    QueryJob,
+    QueryJobConfig,
+    QueryPriority,
+    ScalarQueryParameter,
+)
+from google.cloud.bigquery.table import RowIterator
 from plotly.graph_objects import Figure, Surface
 
-from common.auth import get_gcp_credentials
-from common.config import GOOGLE_CLOUD_PROJECT
+from common.bq_client import get_bq_client, get_bqstorage_client
+from common.config import DASHBOARD_MAX_BYTES_BILLED, GOOGLE_CLOUD_PROJECT
 
 GEX_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure"
+# Latest snapshot per symbol/expiry only; kept current by calculate_and_store_gex
+GEX_LATEST_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure_latest"
+# Net GEX per expiry × strike, pre-aggregated by calculate_and_store_gex
+GEX_SURFACE_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.gamma_exposure_surface"
 TRADE_RECOMMENDATIONS_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_recommendations"
 LIVE_TRADE_PNL_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.live_trade_pnl"
 TRADE_PL_ANALYSIS_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_pl_analysis"
 TRADE_PL_PROJECTIONS_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_pl_projections"
 TRADE_LEGS_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_legs"
 
-# Create BigQuery client using proper credentials
-CREDENTIALS = get_gcp_credentials()
-CLIENT = bigquery.Client(credentials=CREDENTIALS, project=GOOGLE_CLOUD_PROJECT)
+# Live PnL rows older than this can't be any open leg's latest snapshot (trades are
+# closed at EOD); the bound lets BigQuery prune a timestamp-partitioned table
+LIVE_PNL_LOOKBACK_DAYS = 7
+
+# The trade-ID dropdown only offers trades entered within this many days
+TRADE_IDS_LOOKBACK_DAYS = 30
+
+# Seconds to wait on the tiny lookup queries (they normally return in well under one)
+LOOKUP_WAIT_TIMEOUT = 5.0
+
+# Shared pool for overlapping independent queries issued by one dashboard callback
+_QUERY_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bq-query")
+
+
+def _to_df(rows: RowIterator) -> pd.DataFrame:
+    """
+    Downloads a query's rows as Arrow (via the Storage Read API for multi-page results),
+    then hands the buffers to pandas, releasing each Arrow column as it is converted.
+    """
+    return rows.to_arrow(bqstorage_client=get_bqstorage_client()).to_pandas(
+        split_blocks=True, self_destruct=True
+    )
+
+
+def _query_df(sql: str, job_config: QueryJobConfig) -> pd.DataFrame:
+    """Runs a query on the shared client and returns its result as a DataFrame."""
+    return _to_df(get_bq_client().query_and_wait(sql, job_config=job_config))
+
+
+def _job_df(job: QueryJob) -> pd.DataFrame:
+    """Returns the result of a finished query job (e.g. a script's child job) as a DataFrame."""
+    return _to_df(job.result())
+
+
+def _iso_dates(rows: RowIterator, column: str) -> List[str]:
+    """
+    Returns a DATE column of a query result as YYYY-MM-DD strings, formatted by an
+    Arrow cast rather than a per-row strftime; NULL dates are dropped.
+    """
+    dates = rows.to_arrow(bqstorage_client=get_bqstorage_client())[column]
+    return pc.drop_null(dates).cast(pa.string()).to_pylist()
+
+
+def _job_config(*params) -> QueryJobConfig:
+    """
+    Job config shared by every dashboard query: interactive priority, the given query
+    parameters, and a cap on bytes billed so an accidentally unfiltered scan fails fast
+    instead of stalling a callback.
+    """
+    return QueryJobConfig(
+        query_parameters=list(params),
+        maximum_bytes_billed=DASHBOARD_MAX_BYTES_BILLED,
+        priority=QueryPriority.INTERACTIVE,
+    )
+
+
+def _lookup(sql: str, job_config: QueryJobConfig) -> RowIterator:
+    """
+    Runs a small dropdown/detail lookup via the synchronous jobs.query path, giving up
+    after LOOKUP_WAIT_TIMEOUT seconds so a stuck job can't hang the callback; callers
+    already fall back to an empty result on error.
+    """
+    return get_bq_client().query_and_wait(
+        sql, job_config=job_config, wait_timeout=LOOKUP_WAIT_TIMEOUT
+    )
+
+
+def _today_param() -> ScalarQueryParameter:
+    """
+    Today's UTC date as the @today DATE parameter, standing in for CURRENT_DATE() so
+    the query text stays deterministic and cacheable.
+    """
+    return ScalarQueryParameter("today", "DATE", datetime.now(timezone.utc).date())
+
+
+def run_queries_parallel(calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Runs independent query functions concurrently and returns their results by key,
+    so a callback waits for the slowest BigQuery round-trip instead of the sum of them.
+    """
+    futures = {key: _QUERY_POOL.submit(fn) for key, fn in calls.items()}
+    return {key: fut.result() for key, fut in futures.items()}
 
 
 def get_available_expirations() -> List[str]:
@@ -35,19 +129,16 @@ def get_available_expirations() -> List[str]:
     query = f"""
     SELECT
       expiration_date
-    FROM `{GEX_TABLE}`
-    WHERE expiration_date >= CURRENT_DATE()
+    FROM `{GEX_LATEST_TABLE}`
+    WHERE expiration_date >= @today
     GROUP BY expiration_date
     ORDER BY expiration_date DESC
     LIMIT 30
     """
+    # Bind today's (UTC) date: CURRENT_DATE() would make the query ineligible for caching
+    job_conf = _job_config(_today_param())
     try:
-        df = CLIENT.query(query).to_dataframe()
-
-        # make sure it's a datetime and format as string
-        df["expiration_date"] = pd.to_datetime(df["expiration_date"], errors="coerce")
-        df = df.dropna(subset=["expiration_date"])
-        return df["expiration_date"].dt.strftime("%Y-%m-%d").tolist()
+        return _iso_dates(_lookup(query, job_conf), "expiration_date")
 
     except Exception as e:
         logging.error(f"Error fetching available expirations: {e}")
@@ -62,15 +153,13 @@ def get_historical_expirations(limit: int = 30) -> List[str]:
     sql = f"""
     SELECT DISTINCT expiration_date
     FROM `{GEX_TABLE}`
-    WHERE expiration_date <= CURRENT_DATE()
+    WHERE expiration_date <= @today
     ORDER BY expiration_date DESC
     LIMIT @limit
     """
-    job_conf = QueryJobConfig(query_parameters=[ScalarQueryParameter("limit", "INT64", limit)])
-    df = CLIENT.query(sql, job_config=job_conf).to_dataframe()
-    # format as strings
-    df["expiration_date"] = pd.to_datetime(df["expiration_date"], errors="coerce")
-    return df["expiration_date"].dt.strftime("%Y-%m-%d").tolist()
+    job_conf = _job_config(_today_param(), ScalarQueryParameter("limit", "INT64", limit))
+    rows = get_bq_client().query_and_wait(sql, job_config=job_conf)
+    return _iso_dates(rows, "expiration_date")
 
 
 def get_trade_recommendations(status: str) -> pd.DataFrame:
@@ -85,12 +174,12 @@ def get_trade_recommendations(status: str) -> pd.DataFrame:
         ORDER BY entry_time DESC
         LIMIT 50
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("status", "STRING", status)]
-    )
+    job_config = _job_config(ScalarQueryParameter("status", "STRING", status))
 
     try:
-        return CLIENT.query(query, job_config=job_config).to_dataframe()
+        df = _query_df(query, job_config)
+        # Low-cardinality label → categorical, so status masks compare int codes
+        return df.astype({"status": "category"})
     except Exception as e:
         logging.error(f"Error fetching trade recommendations: {e}")
         return pd.DataFrame()
@@ -112,18 +201,19 @@ def get_legs_data(trade_id: str):
         WHERE trade_id = @trade_id
         ORDER BY strike ASC
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("trade_id", "STRING", trade_id)]
-    )
+    job_config = _job_config(ScalarQueryParameter("trade_id", "STRING", trade_id))
 
     try:
-        legs_df = CLIENT.query(query, job_config=job_config).to_dataframe()
+        legs_df = _to_df(_lookup(query, job_config))
         if legs_df.empty:
             return pd.DataFrame(
                 columns=["leg_id", "strike", "direction", "leg_type", "entry_price", "status"]
             )
 
-        return legs_df
+        # Low-cardinality labels → categorical, so status/direction masks compare int codes
+        return legs_df.astype(
+            {"status": "category", "direction": "category", "leg_type": "category"}
+        )
 
     except Exception as e:
         print(f"Error fetching legs for trade_id {trade_id}: {e}")
@@ -141,30 +231,20 @@ def get_live_pnl_data(trade_id: Optional[str] = None) -> pd.DataFrame:
         return pd.DataFrame()
 
     sql = f"""
-    WITH latest AS (
-      SELECT
-        trade_id,
-        leg_id,
-        MAX(timestamp) AS ts
-      FROM `{LIVE_TRADE_PNL_TABLE}`
-      WHERE trade_id = @tid
-      GROUP BY trade_id, leg_id
-    )
     SELECT
-      p.leg_id,
-      p.current_price,
-      p.theoretical_pnl
-    FROM `{LIVE_TRADE_PNL_TABLE}` AS p
-    JOIN latest AS l
-      ON p.trade_id = l.trade_id
-     AND p.leg_id   = l.leg_id
-     AND p.timestamp= l.ts
-    WHERE p.trade_id = @tid
-    """
-    job_conf = QueryJobConfig(query_parameters=[ScalarQueryParameter("tid", "STRING", trade_id)])
+      leg_id,
+      current_price,
+      theoretical_pnl
+    FROM `{LIVE_TRADE_PNL_TABLE}`
+    WHERE trade_id = @tid
+      AND timestamp >= TIMESTAMP(DATE_SUB(@today, INTERVAL {LIVE_PNL_LOOKBACK_DAYS} DAY))
+    -- exactly one row per leg, even if two snapshots share the same timestamp
+    QUALIFY ROW_NUMBER() OVER (PARTITION BY leg_id ORDER BY timestamp DESC) = 1
+    """
+    job_conf = _job_config(ScalarQueryParameter("tid", "STRING", trade_id), _today_param())
 
     try:
-        return CLIENT.query(sql, job_config=job_conf).to_dataframe()
+        return _query_df(sql, job_conf)
     except Exception as e:
         logging.error(f"get_live_pnl_data({trade_id}) failed: {e}")
         return pd.DataFrame()
@@ -180,17 +260,84 @@ def get_trade_pl_analysis(trade_id: str) -> pd.DataFrame:
         FROM `{TRADE_PL_ANALYSIS_TABLE}`
         WHERE trade_id = @trade_id
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("trade_id", "STRING", trade_id)]
-    )
+    job_config = _job_config(ScalarQueryParameter("trade_id", "STRING", trade_id))
 
     try:
-        return CLIENT.query(query, job_config=job_config).to_dataframe()
+        return _to_df(_lookup(query, job_config))
     except Exception as e:
         logging.error(f"Error fetching P/L analysis for trade {trade_id}: {e}")
         return pd.DataFrame()
 
 
+def get_trade_bundle(trade_ids: List[str]) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Fetch legs, P/L analysis and the latest live PnL for several trades at once.
+
+    Submits a single multi-statement script (one SELECT per table, filtered with
+    trade_id IN UNNEST(@ids)) instead of one query per table per trade, downloads
+    each statement's child-job result concurrently, then slices the results per trade.
+
+    Returns:
+        {trade_id: {"legs": df, "pl_analysis": df, "live_pnl": df}} for every requested id;
+        a trade with no rows in a table gets an empty DataFrame with that table's columns.
+    """
+    if not trade_ids:
+        return {}
+
+    queries = {
+        "legs": f"""
+            SELECT trade_id, leg_id, strike, direction, leg_type,
+                   entry_price, exit_price, pnl, status
+            FROM `{TRADE_LEGS_TABLE}`
+            WHERE trade_id IN UNNEST(@ids)
+            ORDER BY trade_id, strike ASC
+        """,
+        "pl_analysis": f"""
+            SELECT trade_id, max_profit, max_loss, breakeven_lower, breakeven_upper,
+                   probability_profit, delta, theta, notes
+            FROM `{TRADE_PL_ANALYSIS_TABLE}`
+            WHERE trade_id IN UNNEST(@ids)
+        """,
+        "live_pnl": f"""
+            SELECT trade_id, leg_id, current_price, theoretical_pnl
+            FROM `{LIVE_TRADE_PNL_TABLE}`
+            WHERE trade_id IN UNNEST(@ids)
+              AND timestamp >= TIMESTAMP(DATE_SUB(@today, INTERVAL {LIVE_PNL_LOOKBACK_DAYS} DAY))
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY trade_id, leg_id ORDER BY timestamp DESC) = 1
+        """,
+    }
+    job_config = _job_config(ArrayQueryParameter("ids", "STRING", trade_ids), _today_param())
+
+    script = ";\n".join(queries.values())
+
+    try:
+        client = get_bq_client()
+        parent = client.query(script, job_config=job_config)
+        parent.result()
+        # Each SELECT runs as its own child job; they execute in statement order
+        children = sorted(client.list_jobs(parent_job=parent), key=lambda job: job.created)
+        frames = run_queries_parallel(
+            {name: partial(_job_df, child) for name, child in zip(queries, children)}
+        )
+    except Exception as e:
+        logging.error(f"Error fetching trade bundle for {trade_ids}: {e}")
+        return {tid: {name: pd.DataFrame() for name in queries} for tid in trade_ids}
+
+    # Low-cardinality labels → categorical, as in get_legs_data
+    frames["legs"] = frames["legs"].astype(
+        {"status": "category", "direction": "category", "leg_type": "category"}
+    )
+
+    bundle = {tid: {} for tid in trade_ids}
+    for name, df in frames.items():
+        groups = dict(tuple(df.groupby("trade_id", sort=False)))
+        empty = df.iloc[0:0].drop(columns="trade_id")
+        for tid in trade_ids:
+            group = groups.get(tid)
+            bundle[tid][name] = empty if group is None else group.drop(columns="trade_id")
+    return bundle
+
+
 def get_trade_pl_projections(trade_id: str) -> pd.DataFrame:
     """
     Fetch P/L projections for a specific trade over time.
@@ -201,12 +348,10 @@ def get_trade_pl_projections(trade_id: str) -> pd.DataFrame:
         WHERE trade_id = @trade_id
         ORDER BY timestamp ASC
     """
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("trade_id", "STRING", trade_id)]
-    )
+    job_config = _job_config(ScalarQueryParameter("trade_id", "STRING", trade_id))
 
     try:
-        return CLIENT.query(query, job_config=job_config).to_dataframe()
+        return _query_df(query, job_config)
     except Exception as e:
         logging.error(f"Error fetching P/L projections for trade {trade_id}: {e}")
         return pd.DataFrame()
@@ -217,44 +362,45 @@ def get_gamma_exposure_for_expiry(
 ) -> Tuple[pd.DataFrame, Optional[float]]:
     """
     Fetches the net gamma exposure by strike for a single expiration date,
-    using the most recent snapshot in analytics.gamma_exposure.
+    using the most recent snapshot in analytics.gamma_exposure_latest.
 
     Returns:
       - DataFrame[strike, net_gamma_exposure]
-      - spot price (underlying_price) for reference line
+      - spot price (median underlying_price of the snapshot) for reference line
     """
     sql = f"""
-    WITH latest AS (
+    WITH snapshot AS (
       SELECT
-        expiration_date,
-        MAX(timestamp) AS ts
-      FROM `{GEX_TABLE}`
+        strike,
+        net_gamma_exposure,
+        underlying_price
+      FROM `{GEX_LATEST_TABLE}`
       WHERE expiration_date = @expiry
-      GROUP BY expiration_date
+      QUALIFY timestamp = MAX(timestamp) OVER ()
+    ),
+    spot AS (
+      -- one median over the whole snapshot (NULLs ignored), not one value per strike
+      SELECT APPROX_QUANTILES(underlying_price, 2)[OFFSET(1)] AS spot_price
+      FROM snapshot
     )
     SELECT
-      ge.strike,
-      SUM(ge.net_gamma_exposure) AS net_gamma_exposure,
-      ANY_VALUE(ge.underlying_price) AS spot_price
-    FROM `{GEX_TABLE}` ge
-    JOIN latest l
-      ON ge.expiration_date = l.expiration_date
-     AND ge.timestamp       = l.ts
-    WHERE ge.expiration_date = @expiry
-    GROUP BY ge.strike
-    ORDER BY ge.strike
-    """
-    job_config = QueryJobConfig(
-        query_parameters=[ScalarQueryParameter("expiry", "DATE", expiration_date)]
-    )
+      s.strike,
+      SUM(s.net_gamma_exposure) AS net_gamma_exposure,
+      ANY_VALUE(spot.spot_price) AS spot_price
+    FROM snapshot s
+    CROSS JOIN spot
+    GROUP BY s.strike
+    ORDER BY s.strike
+    """
+    job_config = _job_config(ScalarQueryParameter("expiry", "DATE", expiration_date))
     try:
-        df = CLIENT.query(sql, job_config=job_config).to_dataframe()
+        df = _query_df(sql, job_config)
         if df.empty:
             return pd.DataFrame(), None
 
-        # Extract spot price (same for all rows)
+        # Extract spot price (same for all rows; NULL if no underlying was recorded)
         spot = df["spot_price"].iloc[0]
-        return df[["strike", "net_gamma_exposure"]], spot
+        return df[["strike", "net_gamma_exposure"]], None if pd.isna(spot) else float(spot)
     except Exception as e:
         logging.error(f"Error fetching GEX for expiry {expiration_date}: {e}")
         return pd.DataFrame(), None
@@ -272,17 +418,21 @@ def get_gamma_exposure_at_time(
     - window_minutes: total minutes of tolerance around snapshot_time
 
     Returns:
-      DataFrame[strike, net_gamma_exposure] for any points within +/- window_minutes/2
+      DataFrame[strike, net_gamma_exposure] summed per strike over all points
+      within +/- window_minutes/2, one row per strike in ascending order
     """
     half = window_minutes // 2
 
     where = [
         # timestamp within ±half minutes of the requested UTC time
-        f"timestamp BETWEEN "
-        f"TIMESTAMP_SUB(TIMESTAMP(@ts), INTERVAL {half} MINUTE) "
-        f"AND TIMESTAMP_ADD(TIMESTAMP(@ts), INTERVAL {half} MINUTE)"
+        "timestamp BETWEEN "
+        "TIMESTAMP_SUB(@ts, INTERVAL @half MINUTE) "
+        "AND TIMESTAMP_ADD(@ts, INTERVAL @half MINUTE)"
+    ]
+    params = [
+        ScalarQueryParameter("ts", "TIMESTAMP", snapshot_time),
+        ScalarQueryParameter("half", "INT64", half),
     ]
-    params = [ScalarQueryParameter("ts", "TIMESTAMP", snapshot_time)]
 
     if expiration_date:
         where.append("expiration_date = @expiry")
@@ -291,14 +441,15 @@ def get_gamma_exposure_at_time(
     sql = f"""
     SELECT
       strike,
-      net_gamma_exposure
+      SUM(net_gamma_exposure) AS net_gamma_exposure
     FROM `{GEX_TABLE}`
     WHERE {' AND '.join(where)}
+    GROUP BY strike
     ORDER BY strike
     """
 
-    job_conf = QueryJobConfig(query_parameters=params)
-    return CLIENT.query(sql, job_config=job_conf).to_dataframe()
+    job_conf = _job_config(*params)
+    return _query_df(sql, job_conf)
 
 
 def get_gamma_exposure_surface_data(start_date: Optional[str], end_date: Optional[str]) -> Figure:
@@ -307,45 +458,39 @@ def get_gamma_exposure_surface_data(start_date: Optional[str], end_date: Optiona
     filtering by expiration_date BETWEEN start_date AND end_date (inclusive).
     """
     sql = f"""
-    WITH latest_per_expiry AS (
-      SELECT expiration_date, MAX(timestamp) AS ts
-      FROM `{GEX_TABLE}`
-      WHERE expiration_date BETWEEN @start_date AND @end_date
-      GROUP BY expiration_date
-    )
-    SELECT
-      ge.expiration_date,
-      ge.strike,
-      SUM(ge.net_gamma_exposure) AS gex
-    FROM `{GEX_TABLE}` ge
-    JOIN latest_per_expiry lpe
-      ON ge.expiration_date = lpe.expiration_date
-     AND ge.timestamp       = lpe.ts
-    GROUP BY ge.expiration_date, ge.strike
-    ORDER BY ge.expiration_date, ge.strike
-    """
-    job_config = QueryJobConfig(
-        query_parameters=[
-            ScalarQueryParameter("start_date", "DATE", start_date),
-            ScalarQueryParameter("end_date", "DATE", end_date),
-        ]
+    SELECT expiration_date, strike, gex
+    FROM `{GEX_SURFACE_TABLE}`
+    WHERE expiration_date BETWEEN @start_date AND @end_date
+    """
+    job_config = _job_config(
+        ScalarQueryParameter("start_date", "DATE", start_date),
+        ScalarQueryParameter("end_date", "DATE", end_date),
     )
     try:
-        df = CLIENT.query(sql, job_config=job_config).to_dataframe()
-        if df.empty:
+        # Arrow table straight from the Storage API; no intermediate DataFrame
+        table = (
+            get_bq_client()
+            .query_and_wait(sql, job_config=job_config)
+            .to_arrow(bqstorage_client=get_bqstorage_client())
+        )
+        if table.num_rows == 0:
             return Figure(layout={"title": "No data for selected date range."})
 
-        # Pivot to grid for Surface plot
-        df["expiration_date"] = pd.to_datetime(df["expiration_date"])
-        pivot = df.pivot_table(
-            index="strike",
-            columns="expiration_date",
-            values="gex",
-            fill_value=0,
+        # Scatter into a dense strike × expiry grid (missing cells stay 0); the roll-up
+        # holds one row per (expiry, strike), so plain assignment suffices
+        strikes, s_codes = np.unique(table["strike"].to_numpy(), return_inverse=True)
+        expiries, e_codes = np.unique(
+            table["expiration_date"].to_numpy().astype("datetime64[D]"), return_inverse=True
         )
-        x = pivot.index.values
-        y = [d.strftime("%Y-%m-%d") for d in pivot.columns]
-        z = np.clip(pivot.values, -1e8, 1e8)
+        # float32 is ample for plotting and halves the grid the clip/JSON passes walk over
+        grid = np.zeros((len(strikes), len(expiries)), dtype=np.float32)
+        grid[s_codes, e_codes] = table["gex"].to_numpy()
+
+        # Clamp outliers in place rather than allocating a second grid
+        np.clip(grid, -1e8, 1e8, out=grid)
+        x = strikes
+        y = np.datetime_as_string(expiries, unit="D").tolist()
+        z = grid
 
         # Build Plotly Surface
         surface = Surface(z=z, x=x, y=y, showscale=True, opacity=0.9)
@@ -369,16 +514,18 @@ def get_gamma_exposure_surface_data(start_date: Optional[str], end_date: Optiona
 
 def get_trade_ids() -> List[str]:
     """
-    Fetch distinct trade IDs for P/L Analysis dropdown.
+    Fetch the 100 most recently entered trade IDs for the P/L Analysis dropdown.
     """
     query = f"""
-        SELECT DISTINCT trade_id 
+        SELECT trade_id
         FROM `{TRADE_RECOMMENDATIONS_TABLE}`
-        ORDER BY trade_id DESC
+        WHERE entry_time >= TIMESTAMP(DATE_SUB(@today, INTERVAL {TRADE_IDS_LOOKBACK_DAYS} DAY))
+        GROUP BY trade_id
+        ORDER BY MAX(entry_time) DESC
         LIMIT 100
     """
     try:
-        df = CLIENT.query(query).to_dataframe()
+        df = _to_df(_lookup(query, _job_config(_today_param())))
         return df["trade_id"].tolist()
     except Exception as e:
         logging.error(f"Error fetching trade IDs: {e}")
@@ -3,10 +3,41 @@
 # Refactored to support multiple symbols: SPX
 # =====================
 import logging
+from datetime import date, datetime
 
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from common.config import BASE_URL, TRADIER_API_KEY
+from common.utils import EASTERN
+
+# ── One pooled HTTP session for every Tradier call ──────────────────────────
+# Reuses TCP/TLS connections across calls (and across the scheduler's fetch
+# threads), retries transient failures with backoff, and never waits forever.
+SESSION = requests.Session()
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            # Randomize the exponential backoff so the scheduler's concurrent fetches
+            # don't all retry a throttled or recovering endpoint in lockstep
+            backoff_jitter=0.25,
+            backoff_max=8,
+            status_forcelist=[429, 500, 502, 503, 504],
+        ),
+    ),
+)
+REQUEST_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+
+# Number of strikes closest to the underlying kept per expiry
+STRIKES_PER_EXPIRY = 200
 
 
 def get_auth_headers():
@@ -18,8 +49,11 @@ def get_auth_headers():
 
 def fetch_underlying_quote(symbol: str) -> dict:
     try:
-        resp = requests.get(
-            f"{BASE_URL}/quotes", headers=get_auth_headers(), params={"symbols": symbol}
+        resp = SESSION.get(
+            f"{BASE_URL}/quotes",
+            headers=get_auth_headers(),
+            params={"symbols": symbol},
+            timeout=REQUEST_TIMEOUT,
         )
         resp.raise_for_status()
         return resp.json().get("quotes", {}).get("quote", {})
@@ -28,15 +62,55 @@ def fetch_underlying_quote(symbol: str) -> dict:
         return {}
 
 
+def fetch_underlying_quotes(symbols: list[str]) -> dict[str, dict]:
+    """
+    Fetch quotes for several symbols in a single /quotes request.
+    Returns {symbol: quote}; symbols Tradier didn't return are absent.
+    """
+    try:
+        resp = SESSION.get(
+            f"{BASE_URL}/quotes",
+            headers=get_auth_headers(),
+            params={"symbols": ",".join(symbols)},
+            timeout=REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        quotes = resp.json().get("quotes", {}).get("quote", [])
+        # Tradier returns a bare object (not a list) when only one symbol matches
+        if isinstance(quotes, dict):
+            quotes = [quotes]
+        return {q["symbol"]: q for q in quotes if "symbol" in q}
+    except Exception as e:
+        logging.error(f"[FETCH ERROR] Unable to fetch quotes for {symbols}: {e}")
+        return {}
+
+
+# symbol -> (ET date fetched, expirations); listings only roll over once a day
+_expirations_cache: dict[str, tuple[date, list[str]]] = {}
+
+
 def get_next_expirations(symbol: str, limit: int = 20):
+    """
+    Upcoming option expirations for symbol, fetched from Tradier at most once per
+    (Eastern) day; failed or empty responses are not cached, so they are retried.
+    """
+    today = datetime.now(EASTERN).date()
+    cached = _expirations_cache.get(symbol)
+    if cached and cached[0] == today:
+        return cached[1][:limit]
+
     try:
-        resp = requests.get(
+        resp = SESSION.get(
             f"{BASE_URL}/options/expirations",
             headers=get_auth_headers(),
             params={"symbol": symbol, "includeAllRoots": "true", "strikes": "false"},
+            timeout=REQUEST_TIMEOUT,
         )
         resp.raise_for_status()
-        return resp.json().get("expirations", {}).get("date", [])[:limit]
+        expirations = resp.json().get("expirations", {}).get("date", [])
+        if expirations:
+            _expirations_cache[symbol] = (today, expirations)
+        return expirations[:limit]
     except Exception as e:
         logging.warning(f"[FETCH WARNING] Failed to get expirations for {symbol}: {e}")
         return []
@@ -49,23 +123,37 @@ def fetch_option_chain(symbol: str, expiration: str, quote: dict):
             logging.warning(f"⚠️ Missing current price for {symbol}, skipping strike filter.")
             return []
 
-        resp = requests.get(
+        resp = SESSION.get(
             f"{BASE_URL}/options/chains",
             headers=get_auth_headers(),
             params={"symbol": symbol, "expiration": expiration, "greeks": "true"},
+            timeout=REQUEST_TIMEOUT,
         )
         resp.raise_for_status()
-        options = resp.json().get("options", {}).get("option", [])
+        # Chains run to several MB of JSON; orjson decodes them far faster than resp.json()
+        options = orjson.loads(resp.content).get("options", {}).get("option", [])
 
-        # Compute mid_price for each option leg
-        for opt in options:
-            bid = opt.get("bid") or 0.0
-            ask = opt.get("ask") or 0.0
-            opt["mid_price"] = (bid + ask) / 2
+        # Compute mid_price for each option leg in one vectorized pass
+        # (a missing/None bid or ask counts as 0.0)
+        n = len(options)
+        bids = np.fromiter((o.get("bid") or 0.0 for o in options), dtype=np.float64, count=n)
+        asks = np.fromiter((o.get("ask") or 0.0 for o in options), dtype=np.float64, count=n)
+        for opt, mid in zip(options, ((bids + asks) * 0.5).tolist()):
+            opt["mid_price"] = mid
 
-        # Filter 200 strikes closest to current price
-        options = sorted(options, key=lambda x: abs(x.get("strike", 0.0) - current_price))
-        return options[:200]
+        # Keep the strikes closest to current price: an O(n) partition finds the cutoff
+        # distance instead of a full sort, then only the candidates within it are ordered
+        # by distance (closest first). Candidates stay in chain order and the sort is
+        # stable, so ties - including at the cutoff - go to the earlier option in the chain
+        strikes = np.fromiter((o.get("strike", 0.0) for o in options), dtype=np.float64, count=n)
+        dists = np.abs(strikes - current_price)
+        if n > STRIKES_PER_EXPIRY:
+            cutoff = np.partition(dists, STRIKES_PER_EXPIRY - 1)[STRIKES_PER_EXPIRY - 1]
+            nearest = np.flatnonzero(dists <= cutoff)
+        else:
+            nearest = np.arange(n)
+        nearest = nearest[np.argsort(dists[nearest], kind="stable")][:STRIKES_PER_EXPIRY]
+        return [options[i] for i in nearest]
 
     except Exception as e:
         logging.error(f"[FETCH ERROR] Unable to fetch option chain for {symbol} {expiration}: {e}")
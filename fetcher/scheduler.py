@@ -2,37 +2,71 @@
 # =====================
 # Orchestrator: market‑data + analytics + trades
 #
-# Cadences:
-#   • upload_index_price   → every  5 min
-#   • option chains + PnL   → every 10 min
-#   • GEX & realized_vol    → every 15 min
-#   • EOD batch (final run) → once at 16:00 ET (via same scheduled_market_data)
+# Cadences (all but heartbeat/0DTE dispatched by market_tick):
+#   • upload_index_price   → every  5 min
+#   • option chains + PnL   → every 10 min
+#   • GEX & realized_vol    → every 15 min
+#   • EOD batch (final run) → once at 16:00 ET (via same market_tick)
 #   • 0DTE trade gen        → at 10:00, 11:00, 12:00, 13:00 ET
 # =====================
 
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
 
-import pytz
+from apscheduler.executors.pool import ThreadPoolExecutor as SchedulerThreadPool
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.combining import OrTrigger
 from apscheduler.triggers.cron import CronTrigger
 
 from analytics.gex_calculator import calculate_and_store_gex
 from analytics.realized_vol import calculate_and_store_realized_vol
-from common.config import SUPPORTED_SYMBOLS  # e.g. ["SPX", "QQQ", ...]
+from common.config import MAX_CHAIN_EXPIRATIONS, SUPPORTED_SYMBOLS  # currently ["SPX"]
 from common.utils import is_trading_hours  # returns True 9:30–16:00 ET Mon–Fri
 from fetcher.fetcher import fetch_option_chain  # fetch option chain for one expiry
-from fetcher.fetcher import fetch_underlying_quote  # fetch latest index quote
+from fetcher.fetcher import fetch_underlying_quotes  # latest quotes, one call for all symbols
 from fetcher.fetcher import get_next_expirations  # list upcoming option expirations
-from fetcher.uploader import upload_index_price, upload_to_bigquery
+from fetcher.uploader import build_option_columns, upload_index_prices, upload_option_columns
 from trade.pnl_monitor import update_trade_pnl  # accepts symbol, quote, mid_maps
 from trade.trade_generator import generate_0dte_trade
 
+logger = logging.getLogger(__name__)
+
 # ── Use a single timezone object for scheduling & conversions ───────────────
-NY_TZ = pytz.timezone("America/New_York")
+NY_TZ = ZoneInfo("America/New_York")
 
 # ── Instantiate the background scheduler with New York timezone ─────────────
-scheduler = BackgroundScheduler(timezone=NY_TZ)
+# Jobs get their own worker threads (a slow market_tick never delays the 0DTE job);
+# a late run is dropped after a minute, and missed runs collapse into one
+scheduler = BackgroundScheduler(
+    timezone=NY_TZ,
+    executors={"default": SchedulerThreadPool(max_workers=4)},
+    job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 60},
+)
+
+# ── Triggers, built once at import (start_scheduler may run again on hot reload) ─
+# Heartbeat: every 30 min, 24/7
+HEARTBEAT_TRIGGER = CronTrigger(minute="*/30", timezone=NY_TZ)
+# market_tick: every 5 min Mon–Fri, 9:00–15:55 ET, plus the EOD run at 16:00 ET
+MARKET_TICK_TRIGGER = OrTrigger(
+    [
+        CronTrigger(day_of_week="mon-fri", hour="9-15", minute="*/5", timezone=NY_TZ),
+        CronTrigger(day_of_week="mon-fri", hour="16", minute="0", timezone=NY_TZ),
+    ]
+)
+# 0DTE trade generator: 10:00, 11:00, 12:00, 13:00 ET sharp
+ZERO_DTE_TRIGGER = CronTrigger(day_of_week="mon-fri", hour="10-13", minute="0", timezone=NY_TZ)
+
+# ── A market_tick job taking longer than this is logged as slow ─────────────
+SLOW_JOB_SECONDS = 60
+
+# ── Concurrent Tradier requests & BigQuery uploads per tick ──────────────────
+# Kept well below the fetcher's HTTP connection pool (and Tradier rate limits)
+FETCH_WORKERS = 16
+# One long-lived pool, reused by every tick instead of spawning threads each time
+fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="market-data")
 
 
 def debug_heartbeat():
@@ -40,23 +74,26 @@ def debug_heartbeat():
     Heartbeat job that logs every 10 min (00,10,20,30,40,50)
     to confirm that the scheduler thread is alive.
     """
-    logging.info("💓 Heartbeat: scheduler is alive.")
+    logger.info("💓 Heartbeat: scheduler is alive.")
 
 
-def scheduled_market_data():
+def scheduled_market_data(force: bool = False):
     """
     Runs every 5 min during trading hours:
       1) ALWAYS: fetch & upload index price for each symbol
       2) ON 10‑MINUTE ticks (minute % 10 == 0):
-         a) fetch & upload option chains for each expiry per symbol
+         a) fetch & upload option chains for every (symbol, expiry) pair at once
          b) build per‑symbol mid_maps
          c) call update_trade_pnl(symbol, quote, mid_maps)
+    All Tradier calls and uploads of a tick share fetch_pool, so the tick takes
+    about as long as its slowest request rather than the sum of them.
     At exactly 16:00 ET, is_trading_hours() still returns True (<= 16:00:59),
     so this final run also triggers the EOD PnL close inside update_trade_pnl.
+    force=True skips the market-hours guard (market_tick has already checked).
     """
     # ── 0) Guard: only run during official market hours (9:30–16:00 ET) ────
-    if not is_trading_hours():
-        logging.debug("Market closed; skipping market_data.")
+    if not force and not is_trading_hours():
+        logger.debug("Market closed; skipping market_data.")
         return
 
     # ── 1) Capture current UTC & ET times for cadence checks & timestamps ───
@@ -66,101 +103,144 @@ def scheduled_market_data():
     # Determine whether this invocation is on a 10‑min boundary
     is_10min = minute % 10 == 0
 
-    # ── 2) Loop through each supported symbol independently ────────────────
-    for sym in SUPPORTED_SYMBOLS:
-        # 2a) Fetch underlying index quote (one API call per symbol)
-        quote = fetch_underlying_quote(sym)
-
-        # 2b) Always upload index price (every 5 min)
-        upload_index_price(sym, quote)
-
-        # ── 3) On 10‑min ticks, also ingest options chain & update PnL ─────
-        if is_10min:
-            # 3a) Prepare a mid‑price map: expiry_date -> {(strike, type): mid_price}
-            per_symbol_mid: dict[str, dict[tuple[float, str], float]] = {}
-
-            # 3b) Retrieve list of upcoming expirations for this symbol
-            expirations = get_next_expirations(sym)
-
+    # ── 2) Fetch every symbol's underlying quote in a single API call ───────
+    quotes = fetch_underlying_quotes(SUPPORTED_SYMBOLS)
+
+    # ── 3) Always upload index prices (every 5 min), all symbols in one insert ─
+    uploads = [
+        fetch_pool.submit(
+            upload_index_prices, {sym: quotes.get(sym, {}) for sym in SUPPORTED_SYMBOLS}
+        )
+    ]
+
+    # ── 4) On 10‑min ticks, also ingest option chains & update PnL ──────────
+    # Per-symbol mid‑price maps: expiry_date -> {(strike, type): mid_price}
+    mid_maps: dict[str, dict[str, dict[tuple[float, str], float]]] = {
+        sym: {} for sym in SUPPORTED_SYMBOLS
+    }
+    if is_10min:
+        # 4a) Nearest upcoming expirations for every symbol, concurrently (bounded
+        #     fan-out: a bad expirations response can't flood the fetch pool)
+        expiration_futures = {
+            fetch_pool.submit(get_next_expirations, sym, limit=MAX_CHAIN_EXPIRATIONS): sym
+            for sym in SUPPORTED_SYMBOLS
+        }
+
+        # 4b) As each symbol's expirations arrive, queue its option-chain fetches,
+        #     so chains for every (symbol, expiry) pair are in flight together
+        chain_futures = {}
+        for future in as_completed(expiration_futures):
+            sym = expiration_futures[future]
+            try:
+                expirations = future.result()
+            except Exception as e:
+                logger.error("❌ Failed to get expirations for %s: %s", sym, e)
+                continue
+            quote = quotes.get(sym, {})
             for exp in expirations:
-                # 3c) Fetch full option chain for this expiry
-                legs = fetch_option_chain(sym, exp, quote)
-                if not legs:
-                    # skip if API returned no data
-                    continue
-
-                # 3d) Upload raw option legs snapshot to BigQuery
-                upload_to_bigquery(legs, now_utc, exp, quote)
+                chain_futures[fetch_pool.submit(fetch_option_chain, sym, exp, quote)] = (sym, exp)
+
+        # 4c) As each chain completes, append its rows and record its mid prices
+        option_columns = build_option_columns([], now_utc)
+        for future in as_completed(chain_futures):
+            sym, exp = chain_futures[future]
+            try:
+                legs = future.result()
+            except Exception as e:
+                logger.error("❌ Failed to fetch %s %s option chain: %s", sym, exp, e)
+                continue
+            if not legs:
+                # skip if API returned no data
+                continue
+
+            build_option_columns(legs, now_utc, quotes.get(sym, {}), columns=option_columns)
+            mid_maps[sym][exp] = {
+                (leg["strike"], leg["option_type"]): leg["mid_price"] for leg in legs
+            }
+
+        # 4d) Upload every chain of this tick as one load job (not one per expiry,
+        #     which would also run into BigQuery's daily per-table load-job quota)
+        n_chains = sum(map(len, mid_maps.values()))
+        uploads.append(
+            fetch_pool.submit(upload_option_columns, option_columns, f"{n_chains} option chains")
+        )
+
+    # ── 5) Invoke the PnL monitor once per symbol, on this thread, while the
+    #       uploads are still in flight (it works from mid_maps, not those tables)
+    if is_10min:
+        for sym in SUPPORTED_SYMBOLS:
+            update_trade_pnl(symbol=sym, quote=quotes.get(sym, {}), mid_maps=mid_maps[sym])
+
+    # ── 6) Let this tick's snapshots land before returning, so the analytics
+    #       market_tick runs next (GEX) read them
+    for future in as_completed(uploads):
+        try:
+            future.result()
+        except Exception as e:
+            logger.error("❌ Upload failed: %s", e)
+
+
+def market_tick():
+    """
+    Single 5‑minute dispatcher for the market‑hours jobs (one scheduler wake-up
+    instead of one per job):
+      - ALWAYS: scheduled_market_data (index prices; chains + PnL on 10‑min ticks)
+      - ON 15‑MINUTE ticks: GEX, then realized vol, so both see this tick's snapshots
+    A failing job is logged and does not stop the ones after it.
+    Market hours are checked once, at the start of the tick, and every job is run
+    with force=True: the 16:00 EOD tick must still run GEX and realized vol even
+    when the market-data fetch before them finishes after 16:00:59.
+    """
+    # The cron window opens at 9:00 ET; check market hours once for the whole tick
+    # rather than letting each job wake up only to hit its own guard
+    if not is_trading_hours():
+        logger.debug("Market closed; skipping market_tick.")
+        return
 
-                # 3e) Build a lookup of mid_prices for PnL computation
-                per_symbol_mid[exp] = {
-                    (leg["strike"], leg["option_type"]): leg["mid_price"] for leg in legs
-                }
+    jobs = [scheduled_market_data]
+    if datetime.now(NY_TZ).minute % 15 == 0:
+        jobs += [calculate_and_store_gex, calculate_and_store_realized_vol]
 
-            # 3f) Invoke the PnL monitor once per symbol, passing mid_maps
-            update_trade_pnl(symbol=sym, quote=quote, mid_maps=per_symbol_mid)
+    for job in jobs:
+        started = time.monotonic()
+        try:
+            job(force=True)
+        except Exception as e:
+            logger.exception("💥 %s failed: %s", job.__name__, e)
+        elapsed = time.monotonic() - started
+        if elapsed > SLOW_JOB_SECONDS:
+            logger.warning("🐢 %s took %.1fs (> %ss)", job.__name__, elapsed, SLOW_JOB_SECONDS)
 
 
 def start_scheduler():
     """
     Configure and start all scheduled jobs:
-      - Heartbeat (every 30 min)
-      - scheduled_market_data (every 10 min)
-      - GEX & realized_vol analytics (every 15 min)
-      - EOD batch at 16:00 ET (via scheduled_market_data + analytics)
-      - 0DTE trade generator (at 10–13 ET sharp)
+      - Heartbeat (every 30 min)
+      - market_tick (every 5 min + EOD at 16:00 ET): market data every tick,
+        GEX & realized_vol analytics on 15‑min ticks
+      - 0DTE trade generator (at 10–13 ET sharp)
     """
-    # ── If already running (hot reload), clear existing jobs first ─────────
-    if scheduler.running:
-        scheduler.remove_all_jobs()
+    # Stable job ids + replace_existing: calling this again (hot reload) updates
+    # the jobs in place instead of dropping and re-creating the whole job graph
 
     # 1) Heartbeat job – logs every 30 min, 24/7
-    scheduler.add_job(
-        debug_heartbeat,
-        CronTrigger(minute="*/30", timezone=NY_TZ),
-    )
-
-    # 2) Market‑data job: every 5 min Mon–Fri, 9:00–15:55 ET
-    scheduler.add_job(
-        scheduled_market_data,
-        CronTrigger(
-            day_of_week="mon-fri",
-            hour="9-15",
-            minute="0,5,10,15,20,25,30,35,40,45,50,55",
-            timezone=NY_TZ,
-        ),
-    )
-
-    # 3) GEX analytics: every 15 min Mon–Fri, 9:00–15:45 ET
-    scheduler.add_job(
-        calculate_and_store_gex,
-        CronTrigger(day_of_week="mon-fri", hour="9-15", minute="0,15,30,45", timezone=NY_TZ),
-    )
-
-    # 4) Realized‑vol analytics: every 15 min Mon–Fri, 9:00–15:45 ET
-    scheduler.add_job(
-        calculate_and_store_realized_vol,
-        CronTrigger(day_of_week="mon-fri", hour="9-15", minute="0,15,30,45", timezone=NY_TZ),
-    )
+    scheduler.add_job(debug_heartbeat, HEARTBEAT_TRIGGER, id="heartbeat", replace_existing=True)
 
-    # 5) End‑of‑day snapshot at exactly 16:00 ET:
-    #    scheduled_market_data will run (and because is_trading_hours() is True),
-    #    its 10‑min branch fires (minute==0), and update_trade_pnl() will detect
-    #    EOD inside and close out legs.
-    eod_trigger = CronTrigger(day_of_week="mon-fri", hour="16", minute="0", timezone=NY_TZ)
-    scheduler.add_job(scheduled_market_data, eod_trigger)
-    scheduler.add_job(calculate_and_store_gex, eod_trigger)
-    scheduler.add_job(calculate_and_store_realized_vol, eod_trigger)
+    # 2) Market data + analytics: one dispatcher every 5 min Mon–Fri, 9:00–15:55 ET,
+    #    plus the end‑of‑day run at exactly 16:00 ET. At 16:00 scheduled_market_data
+    #    runs (is_trading_hours() is still True), its 10‑min branch fires (minute==0)
+    #    and update_trade_pnl() detects EOD inside and closes out legs.
+    scheduler.add_job(market_tick, MARKET_TICK_TRIGGER, id="market_tick", replace_existing=True)
 
-    # 6) 0DTE Iron‑Condor trade generator at 10:00,11:00,12:00,13:00 ET sharp
+    # 3) 0DTE Iron‑Condor trade generator at 10:00,11:00,12:00,13:00 ET sharp
     scheduler.add_job(
-        generate_0dte_trade,
-        CronTrigger(day_of_week="mon-fri", hour="10,11,12,13", minute="0", timezone=NY_TZ),
+        generate_0dte_trade, ZERO_DTE_TRIGGER, id="generate_0dte_trade", replace_existing=True
     )
 
-    # ── Start the APScheduler background thread ─────────────────────────────
-    scheduler.start()
-    logging.info("📅 Scheduler running: 5/10/15 min cadences + EOD + 0DTE jobs.")
+    # ── Start the APScheduler background thread (once) ──────────────────────
+    if not scheduler.running:
+        scheduler.start()
+    logger.info("📅 Scheduler running: 5/10/15 min cadences + EOD + 0DTE jobs.")
 
 
 def shutdown_scheduler():
@@ -169,4 +249,5 @@ def shutdown_scheduler():
     """
     if scheduler.running:
         scheduler.shutdown()
-        logging.info("🛑 Scheduler stopped.")
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        logger.info("🛑 Scheduler stopped.")
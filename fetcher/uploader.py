@@ -1,122 +1,172 @@
 # =====================
 # fetcher/uploader.py
-# Upload options and index price to BigQuery (with explicit credentials)
+# Upload options (Parquet load jobs) and index price (streaming inserts) to BigQuery
 # =====================
 import logging
 from datetime import datetime, timezone
+from functools import lru_cache
 
 import pandas as pd
-from pandas_gbq import to_gbq
+from google.cloud.bigquery import LoadJobConfig
 
-from common.auth import get_gcp_credentials
+from common.bq_client import APPEND_PARQUET, get_bq_client
 from common.config import (
-    GOOGLE_CLOUD_PROJECT,
     INDEX_PRICE_TABLE_ID,
     INDEX_PRICE_TIME_INTERVAL,
     OPTION_CHAINS_TABLE_ID,
     SOURCE,
 )
 
+logger = logging.getLogger(__name__)
 
-def upload_to_bigquery(options, timestamp, expiration, underlying_price=None):
-    credentials = get_gcp_credentials()
+# option_chains columns copied as-is from each Tradier option, and from its greeks
+OPTION_FIELDS = (
+    "symbol",
+    "root_symbol",
+    "option_type",
+    "expiration_date",
+    "expiration_type",
+    "strike",
+    "bid",
+    "ask",
+    "last",
+    "change",
+    "change_percentage",
+    "volume",
+    "open_interest",
+    "bidsize",
+    "asksize",
+    "high",
+    "low",
+    "open",
+    "close",
+)
+GREEK_FIELDS = ("delta", "gamma", "theta", "vega", "rho", "bid_iv", "ask_iv", "mid_iv", "smv_vol")
+OPTION_COLUMNS = (
+    "timestamp",
+    "quote_time",
+    *OPTION_FIELDS,
+    "mid_price",
+    *GREEK_FIELDS,
+    "underlying_price",
+)
+_EMPTY_GREEKS: dict = {}
 
-    rows = []
-    for opt in options:
-        g = opt.get("greeks") or {}
 
-        # Calculate mid_price with proper handling
-        bid = opt.get("bid")
-        ask = opt.get("ask")
-        mid_price = (bid + ask) / 2 if bid is not None and ask is not None else None
+@lru_cache(maxsize=None)
+def _append_config(table_id: str, columns: tuple[str, ...]) -> LoadJobConfig:
+    """
+    APPEND_PARQUET plus table_id's schema (restricted to columns), looked up once per
+    process. Without a schema, every load_table_from_dataframe call first spends a
+    get_table round trip fetching it.
+    """
+    config = LoadJobConfig.from_api_repr(APPEND_PARQUET.to_api_repr())
+    config.schema = [f for f in get_bq_client().get_table(table_id).schema if f.name in columns]
+    return config
 
-        rows.append(
-            {
-                "timestamp": timestamp,
-                "quote_time": timestamp,  # quote_time is the same as timestamp initially
-                "symbol": opt.get("symbol"),
-                "root_symbol": opt.get("root_symbol"),
-                "option_type": opt.get("option_type"),
-                "expiration_date": opt.get("expiration_date"),
-                "expiration_type": opt.get("expiration_type"),
-                "strike": opt.get("strike"),
-                "bid": bid,
-                "ask": ask,
-                "mid_price": mid_price,
-                "last": opt.get("last"),
-                "change": opt.get("change"),
-                "change_percentage": opt.get("change_percentage"),
-                "volume": opt.get("volume"),
-                "open_interest": opt.get("open_interest"),
-                "bidsize": opt.get("bidsize"),
-                "asksize": opt.get("asksize"),
-                "high": opt.get("high"),
-                "low": opt.get("low"),
-                "open": opt.get("open"),
-                "close": opt.get("close"),
-                "delta": g.get("delta"),
-                "gamma": g.get("gamma"),
-                "theta": g.get("theta"),
-                "vega": g.get("vega"),
-                "rho": g.get("rho"),
-                "bid_iv": g.get("bid_iv"),
-                "ask_iv": g.get("ask_iv"),
-                "mid_iv": g.get("mid_iv"),
-                "smv_vol": g.get("smv_vol"),
-                "underlying_price": underlying_price.get("last") if underlying_price else None,
-            }
-        )
 
-    df = pd.DataFrame(rows)
+def _append_dataframe(df: pd.DataFrame, table_id: str):
+    """Loads df into table_id on the shared client and waits for the job to finish."""
+    job_config = _append_config(table_id, tuple(df.columns))
+    get_bq_client().load_table_from_dataframe(df, table_id, job_config=job_config).result()
+
+
+def build_option_columns(options, timestamp, underlying_price=None, columns=None) -> dict:
+    """
+    Flattens one Tradier option chain into option_chains columns (name -> list of
+    values, no I/O). Pass the result back in as columns= to append further chains,
+    then load them all together via upload_option_columns.
+    """
+    if columns is None:
+        columns = {name: [] for name in OPTION_COLUMNS}
+
+    # Column at a time: one list comprehension per field instead of a dict per row
+    for name in OPTION_FIELDS:
+        columns[name].extend([opt.get(name) for opt in options])
+    greeks = [opt.get("greeks") or _EMPTY_GREEKS for opt in options]
+    for name in GREEK_FIELDS:
+        columns[name].extend([g.get(name) for g in greeks])
+
+    # Calculate mid_price with proper handling
+    columns["mid_price"].extend(
+        [
+            (
+                (opt["bid"] + opt["ask"]) / 2
+                if opt.get("bid") is not None and opt.get("ask") is not None
+                else None
+            )
+            for opt in options
+        ]
+    )
+
+    n = len(options)
+    columns["timestamp"].extend([timestamp] * n)
+    columns["quote_time"].extend([timestamp] * n)  # same as timestamp initially
+    last = underlying_price.get("last") if underlying_price else None
+    columns["underlying_price"].extend([last] * n)
+    return columns
+
+
+def upload_option_columns(columns: dict, description: str):
+    """
+    Appends option_chains columns (from build_option_columns, possibly spanning many
+    symbols and expiries) to BigQuery as a single load job.
+    """
+    if not columns["timestamp"]:
+        return
+
+    df = pd.DataFrame(columns, copy=False)
 
     try:
-        to_gbq(
-            df,
-            OPTION_CHAINS_TABLE_ID,
-            project_id=GOOGLE_CLOUD_PROJECT,
-            if_exists="append",
-            credentials=credentials,
-        )
-        logging.info(f"✅ Uploaded {len(df)} rows for {expiration}")
+        # Tradier sends YYYY-MM-DD strings; Parquet needs real dates for the DATE column
+        df["expiration_date"] = pd.to_datetime(df["expiration_date"]).dt.date
+        _append_dataframe(df, OPTION_CHAINS_TABLE_ID)
+        logger.info("✅ Uploaded %d rows for %s", len(df), description)
     except Exception as e:
-        logging.error(f"❌ Failed to upload options data to BigQuery: {e}")
+        logger.error("❌ Failed to upload options data to BigQuery: %s", e)
 
 
-def upload_index_price(symbol: str, quote: dict):
-    if not quote or "last" not in quote:
-        logging.warning(f"⚠️ Invalid quote for {symbol}")
-        return
+def upload_to_bigquery(options, timestamp, expiration, underlying_price=None):
+    upload_option_columns(build_option_columns(options, timestamp, underlying_price), expiration)
 
-    credentials = get_gcp_credentials()
-    now = datetime.now(timezone.utc)
 
-    df = pd.DataFrame(
-        [
+# Index-price fields copied as-is from a Tradier quote
+QUOTE_FIELDS = ("last", "high", "low", "open", "close", "volume")
+
+
+def upload_index_prices(quotes: dict[str, dict]):
+    """
+    Streams one index_price row per symbol ({symbol: quote}) in a single
+    insert_rows_json call. The rows are tiny, so a streaming insert skips both the
+    DataFrame and the load-job round trips (submit, poll) a Parquet upload would pay.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    rows = []
+    for symbol, quote in quotes.items():
+        if not quote or "last" not in quote:
+            logger.warning("⚠️ Invalid quote for %s", symbol)
+            continue
+        rows.append(
             {
                 "timestamp": now,
                 "symbol": symbol,
-                "last": quote.get("last"),
-                "high": quote.get("high"),
-                "low": quote.get("low"),
-                "open": quote.get("open"),
-                "close": quote.get("close"),
-                "volume": quote.get("volume"),
+                **{field: quote.get(field) for field in QUOTE_FIELDS},
                 "source": SOURCE,
                 "time_interval": INDEX_PRICE_TIME_INTERVAL,
             }
-        ]
-    )
-
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        )
+    if not rows:
+        return
 
+    symbols = ", ".join(row["symbol"] for row in rows)
     try:
-        to_gbq(
-            df,
-            INDEX_PRICE_TABLE_ID,
-            project_id=GOOGLE_CLOUD_PROJECT,
-            if_exists="append",
-            credentials=credentials,
-        )
-        logging.info(f"✅ Uploaded index price for {symbol}")
+        errors = get_bq_client().insert_rows_json(INDEX_PRICE_TABLE_ID, rows)
+        if errors:
+            raise RuntimeError(errors)
+        logger.info("✅ Uploaded index price for %s", symbols)
     except Exception as e:
-        logging.error(f"❌ Failed to upload index price for {symbol}: {e}")
+        logger.error("❌ Failed to upload index price for %s: %s", symbols, e)
+
+
+def upload_index_price(symbol: str, quote: dict):
+    upload_index_prices({symbol: quote})
@@ -1,10 +1,16 @@
 # tests/test_fetcher.py
+import json
 from unittest.mock import patch
 
 import pytest
-import requests
 
-from fetcher.fetcher import fetch_option_chain, fetch_underlying_quote, get_next_expirations
+from fetcher.fetcher import (
+    REQUEST_TIMEOUT,
+    fetch_option_chain,
+    fetch_underlying_quote,
+    fetch_underlying_quotes,
+    get_next_expirations,
+)
 
 # =====================
 # tests/test_fetcher.py
@@ -57,7 +63,7 @@ def mock_option_chain():
     }
 
 
-@patch("requests.get")
+@patch("fetcher.fetcher.SESSION.get")
 def test_fetch_underlying_quote(mock_get, mock_quote):
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = mock_quote
@@ -65,21 +71,41 @@ def test_fetch_underlying_quote(mock_get, mock_quote):
     result = fetch_underlying_quote("SPY")
     assert result["last"] == 420.0
     assert result["high"] == 425.0
+    assert mock_get.call_args.kwargs["timeout"] == REQUEST_TIMEOUT
 
 
-@patch("requests.get")
-def test_get_next_expirations(mock_get, mock_expirations):
+@patch("fetcher.fetcher.SESSION.get")
+def test_fetch_underlying_quotes(mock_get):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.json.return_value = {
+        "quotes": {"quote": [{"symbol": "SPX", "last": 5000.0}, {"symbol": "SPY", "last": 500.0}]}
+    }
+
+    quotes = fetch_underlying_quotes(["SPX", "SPY"])
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["params"] == {"symbols": "SPX,SPY"}
+    assert quotes["SPX"]["last"] == 5000.0
+    assert quotes["SPY"]["last"] == 500.0
+
+
+@patch("fetcher.fetcher.SESSION.get")
+def test_get_next_expirations(mock_get, mock_expirations, monkeypatch):
+    monkeypatch.setattr("fetcher.fetcher._expirations_cache", {})
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = mock_expirations
 
     dates = get_next_expirations("SPY", limit=2)
     assert dates == ["2025-05-06", "2025-05-07"]
 
+    # Same day: served from the cache, without another request
+    assert get_next_expirations("SPY", limit=3) == mock_expirations["expirations"]["date"]
+    assert mock_get.call_count == 1
+
 
-@patch("requests.get")
+@patch("fetcher.fetcher.SESSION.get")
 def test_fetch_option_chain(mock_get, mock_option_chain, mock_quote):
     mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = mock_option_chain
+    mock_get.return_value.content = json.dumps(mock_option_chain).encode()
 
     quote = mock_quote["quotes"]["quote"]
     chain = fetch_option_chain("SPY", "2025-05-06", quote)
@@ -87,7 +113,41 @@ def test_fetch_option_chain(mock_get, mock_option_chain, mock_quote):
     assert sorted(chain, key=lambda x: x["strike"])[0]["strike"] == 410
 
 
-@patch("requests.get")
+@patch("fetcher.fetcher.SESSION.get")
+def test_fetch_option_chain_ties_keep_chain_order(mock_get, mock_quote, monkeypatch):
+    monkeypatch.setattr("fetcher.fetcher.STRIKES_PER_EXPIRY", 33)
+    # last = 420 and strikes repeat on a 5-point grid, so most distances tie (also at the
+    # cutoff); equal distances must keep chain order, exactly like a stable sort
+    strikes = [400 + 5 * ((7 * i) % 10) for i in range(51)]
+    options = [{"id": i, "strike": k} for i, k in enumerate(strikes)]
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.content = json.dumps({"options": {"option": options}}).encode()
+
+    chain = fetch_option_chain("SPY", "2025-05-06", mock_quote["quotes"]["quote"])
+    expected = sorted(options, key=lambda o: abs(o["strike"] - 420))[:33]
+    assert [opt["id"] for opt in chain] == [opt["id"] for opt in expected]
+
+
+@patch("fetcher.fetcher.SESSION.get")
+def test_fetch_option_chain_mid_price(mock_get, mock_quote):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.content = json.dumps(
+        {
+            "options": {
+                "option": [
+                    {"strike": 415, "bid": 1.0, "ask": 1.5},
+                    {"strike": 420, "bid": None, "ask": 2.0},
+                ]
+            }
+        }
+    ).encode()
+
+    chain = fetch_option_chain("SPY", "2025-05-06", mock_quote["quotes"]["quote"])
+    mids = {opt["strike"]: opt["mid_price"] for opt in chain}
+    assert mids == {415: 1.25, 420: 1.0}
+
+
+@patch("fetcher.fetcher.SESSION.get")
 def test_fetch_option_chain_no_price(mock_get):
     quote = {}  # missing "last"
     chain = fetch_option_chain("SPY", "2025-05-06", quote)
@@ -1,4 +1,5 @@
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
 from unittest.mock import MagicMock
 
 import pandas as pd
@@ -14,17 +15,51 @@ import trade.pnl_monitor as pnl_monitor
 # =====================
 
 
-class DummyDateTimeFactory:
-    def __init__(self, fixed):
-        self.fixed = fixed
+class FrozenDateTime(datetime):
+    """datetime whose now() returns `fixed` once a test has frozen the clock."""
 
-    def __call__(self, cls):
-        class DT(cls):
-            @classmethod
-            def now(cls, tz=None):
-                return self.fixed
+    fixed = None
 
-        return DT
+    @classmethod
+    def now(cls, tz=None):
+        return super().now(tz) if cls.fixed is None else cls.fixed
+
+
+def qresult(df=None):
+    """Minimal stand-in for a QueryJob: only to_dataframe() is ever read back."""
+    return SimpleNamespace(to_dataframe=lambda: df)
+
+
+@pytest.fixture(autouse=True)
+def freeze(monkeypatch):
+    """Give pnl_monitor the frozen clock; tests call freeze(dt) to pin now() to dt."""
+    monkeypatch.setattr(pnl_monitor, "datetime", FrozenDateTime)
+    monkeypatch.setattr(FrozenDateTime, "fixed", None)
+    return lambda fixed: setattr(FrozenDateTime, "fixed", fixed)
+
+
+def last_query_containing(client, needle):
+    """The most recent CLIENT.query call whose SQL contains `needle`."""
+    return next(c for c in reversed(client.query.call_args_list) if needle in c[0][0])
+
+
+def query_param(call, name):
+    """The `name` query parameter of a recorded CLIENT.query call, or None if not sent."""
+    return next((p for p in call[1]["job_config"].query_parameters if p.name == name), None)
+
+
+def merge_rows(call):
+    """Rows of the @rows ARRAY<STRUCT> parameter sent with a MERGE, as dicts."""
+    return [row.struct_values for row in query_param(call, "rows").values]
+
+
+def rec_updates(client):
+    """Rows of the latest trade_recommendations MERGE, read off the call once."""
+    return merge_rows(last_query_containing(client, pnl_monitor.TRADE_RECS))
+
+
+# One empty result shared by every test; update_trade_pnl only reads it
+EMPTY_DF = pd.DataFrame()
 
 
 @pytest.fixture(autouse=True)
@@ -32,26 +67,41 @@ def dummy_client(monkeypatch):
     """Replace the BigQuery client with a MagicMock for each test."""
     client = MagicMock()
     # Default .query().to_dataframe() to empty DataFrame
-    client.query.return_value.to_dataframe.return_value = pd.DataFrame()
+    client.query.return_value.to_dataframe.return_value = EMPTY_DF
     monkeypatch.setattr(pnl_monitor, "CLIENT", client)
     return client
 
 
-@pytest.fixture
-def sample_leg_df():
-    """Sample DataFrame representing one open trade leg."""
+# Expiry shared by every sample leg
+SAMPLE_EXP = date(2025, 5, 15)
+
+
+@pytest.fixture(scope="session")
+def _sample_leg_df_base():
+    """One open trade leg, built once per session; tests get copies via sample_leg_df."""
     return pd.DataFrame(
-        [
-            {
-                "trade_id": "T1",
-                "leg_id": "L1",
-                "strike": 100.0,
-                "leg_type": "call",
-                "direction": "long",
-                "entry_price": 5.0,
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
-            }
-        ]
+        {
+            "trade_id": ["T1"],
+            "leg_id": ["L1"],
+            "strike": [100.0],
+            "leg_type": ["call"],
+            "direction": ["long"],
+            "entry_price": [5.0],
+            "expiration_date": [SAMPLE_EXP],
+        }
+    )
+
+
+@pytest.fixture
+def sample_leg_df(_sample_leg_df_base):
+    """Sample DataFrame representing one open trade leg (a per-test copy, safe to mutate)."""
+    return _sample_leg_df_base.copy()
+
+
+def with_eod_info(legs, max_profit=None, max_loss=None, short_put=None, short_call=None):
+    """Legs as the EOD query returns them: P/L bounds and short strikes joined per trade."""
+    return legs.assign(
+        max_profit=max_profit, max_loss=max_loss, short_put=short_put, short_call=short_call
     )
 
 
@@ -62,77 +112,63 @@ def test_no_open_legs(dummy_client):
     """
     No open legs => function returns early w/o any insert.
     """
-    dummy_client.query.return_value.to_dataframe.return_value = pd.DataFrame()
+    # update_trade_pnl only checks .empty before bailing out; no frame is needed
+    dummy_client.query.return_value = qresult(SimpleNamespace(empty=True))
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 100}, mid_maps={})
+    dummy_client.query.assert_called_once()
     dummy_client.insert_rows_json.assert_not_called()
 
 
 def test_missing_quote(dummy_client, sample_leg_df):
     """
-    Open legs but missing quote => skip PnL update.
+    Open legs but missing quote => skip PnL update, without even querying the legs.
     """
     dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
     pnl_monitor.update_trade_pnl("SPX", quote=None, mid_maps={})
+    pnl_monitor.update_trade_pnl("SPX", quote={"bid": 100.0}, mid_maps={})
+    dummy_client.query.assert_not_called()
     dummy_client.insert_rows_json.assert_not_called()
 
 
-def test_intraday_pnl(monkeypatch, dummy_client, sample_leg_df):
+@pytest.mark.parametrize(
+    "mid_maps, expected_price, expected_pnl",
+    [
+        ({SAMPLE_EXP: {(100.0, "call"): 7.0}}, 7.0, 2.0),
+        # no mid_map entry => current=entry_price => raw_pnl=0
+        ({}, 5.0, 0.0),
+        # the scheduler keys mid_maps by "YYYY-MM-DD" strings; legs carry DATE values
+        ({"2025-05-15": {(100.0, "call"): 7.0}}, 7.0, 2.0),
+    ],
+    ids=["mid", "fallback-to-entry", "expiry-string-key"],
+)
+def test_intraday_pnl(freeze, dummy_client, sample_leg_df, mid_maps, expected_price, expected_pnl):
     """
     Intraday: compute raw_pnl in points, *100, status='open'.
     """
     dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
     # Freeze time to 2025-05-10 12:00 UTC => ET ~08:00
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
-
-    quote = {"last": 110.0}
-    mid_maps = {sample_leg_df.iloc[0]["expiration_date"]: {(100.0, "call"): 7.0}}
-    pnl_monitor.update_trade_pnl("SPX", quote=quote, mid_maps=mid_maps)
+    pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
 
-    # Expect theoretical_pnl=2.0, status open
+    # Expect the leg marked at its mid (or entry), status open
     dummy_client.insert_rows_json.assert_called_once()
     _, rows = dummy_client.insert_rows_json.call_args[0]
     r = rows[0]
-    assert r["theoretical_pnl"] == 2.0
+    assert r["current_price"] == expected_price
+    assert r["theoretical_pnl"] == expected_pnl
     assert r["status"] == "open"
 
     # Both trade_legs and trade_recommendations updates
-    updates = [c for c in dummy_client.query.call_args_list if "UPDATE" in c[0][0]]
-    assert any("trade_legs" in c[0][0] for c in updates)
-    assert any("trade_recommendations" in c[0][0] for c in updates)
-
-
-def test_mid_map_fallback_to_entry_price(monkeypatch, dummy_client, sample_leg_df):
-    """
-    No mid_map entry => current=entry_price => raw_pnl=0.
-    """
-    dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
-    # Freeze intraday
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
-
-    quote = {"last": 110.0}
-    pnl_monitor.update_trade_pnl("SPX", quote=quote, mid_maps={})
-    _, rows = dummy_client.insert_rows_json.call_args[0]
-    assert rows[0]["theoretical_pnl"] == 0.0
+    merged = {sql for (sql, *_), _ in dummy_client.query.call_args_list if "MERGE" in sql}
+    assert any("trade_legs" in sql for sql in merged)
+    assert any("trade_recommendations" in sql for sql in merged)
 
 
 # ---------- Multi‑leg roll‑up intraday ----------
 
 
-def test_multileg_rollup_intraday(monkeypatch, dummy_client):
+def test_multileg_rollup_intraday(freeze, dummy_client):
     """
     Two legs same trade_id => sum raw_pnl then *100.
     Leg1: long call entry 5, mid 7 => +2
@@ -148,7 +184,7 @@ def test_multileg_rollup_intraday(monkeypatch, dummy_client):
                 "leg_type": "call",
                 "direction": "long",
                 "entry_price": 5.0,
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
+                "expiration_date": SAMPLE_EXP,
             },
             {
                 "trade_id": "T1",
@@ -157,100 +193,76 @@ def test_multileg_rollup_intraday(monkeypatch, dummy_client):
                 "leg_type": "put",
                 "direction": "short",
                 "entry_price": 2.0,
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
+                "expiration_date": SAMPLE_EXP,
             },
         ]
     )
     dummy_client.query.return_value.to_dataframe.return_value = df
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
-
-    mid_maps = {pd.Timestamp("2025-05-15").date(): {(100.0, "call"): 7.0, (100.0, "put"): 1.0}}
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 7.0, (100.0, "put"): 1.0}}
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
 
-    rec_calls = [c for c in dummy_client.query.call_args_list if "trade_recommendations" in c[0][0]]
-    # last rec update
-    job = rec_calls[-1][1]["job_config"]
-    params = {p.name: p.value for p in job.query_parameters}
-    assert params["pnl"] == 300.0
+    # Both leg snapshots go out in one insert, each with its own dedup row id
+    dummy_client.insert_rows_json.assert_called_once()
+    _, rows = dummy_client.insert_rows_json.call_args[0]
+    assert [r["leg_id"] for r in rows] == ["L1", "L2"]
+    row_ids = dummy_client.insert_rows_json.call_args[1]["row_ids"]
+    assert len(set(row_ids)) == 2
+
+    # one MERGE row for the trade
+    (rec,) = rec_updates(dummy_client)
+    assert rec["trade_id"] == "T1" and rec["pnl"] == 300.0
 
 
 # ---------- EOD branches ----------
 
 
-def test_eod_pnl_closed(monkeypatch, dummy_client, sample_leg_df):
+def test_eod_pnl_closed(freeze, dummy_client, sample_leg_df):
     """
     EOD with P/L analysis present => use max_profit/max_loss logic.
     """
-    legs = sample_leg_df
-    pl_df = pd.DataFrame([{"max_profit": 100.0, "max_loss": -50.0}])
-    info_df = pd.DataFrame(
-        [
-            {"direction": "short", "leg_type": "put", "strike": 95.0},
-            {"direction": "short", "leg_type": "call", "strike": 105.0},
-        ]
-    )
-    # stub 5 queries: legs, upd legs, pl_df, info_df, upd recs
+    legs = with_eod_info(sample_leg_df, 100.0, -50.0, short_put=95.0, short_call=105.0)
+    # stub 3 queries: legs (with P/L bounds and short strikes), merge legs, merge recs
     dummy_client.query.side_effect = [
-        MagicMock(to_dataframe=MagicMock(return_value=legs)),
-        MagicMock(),
-        MagicMock(to_dataframe=MagicMock(return_value=pl_df)),
-        MagicMock(to_dataframe=MagicMock(return_value=info_df)),
-        MagicMock(),
+        qresult(legs),
+        qresult(),
+        qresult(),
     ]
     # Freeze to ET16:01 => UTC20:01
-    fixed = datetime(2025, 5, 10, 20, 1, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 20, 1, tzinfo=timezone.utc))
 
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 100.0}, mid_maps={})
+    # P/L bounds and short strikes come back with the legs, in one job
+    assert dummy_client.query.call_count == 3
+    legs_sql = dummy_client.query.call_args_list[0][0][0]
+    assert pnl_monitor.PL_ANALYSIS in legs_sql and "short_put" in legs_sql
     # snapshot status closed
     _, rows = dummy_client.insert_rows_json.call_args[0]
     assert rows[0]["status"] == "closed"
     # final pnl from max_profit
-    rec = [c for c in dummy_client.query.call_args_list if "trade_recommendations" in c[0][0]][-1]
-    params = {p.name: p.value for p in rec[1]["job_config"].query_parameters}
+    (params,) = rec_updates(dummy_client)
     assert params["pnl"] == 100.0 and params["status"] == "closed"
 
 
-def test_eod_fallback_to_raw_sum(monkeypatch, dummy_client, sample_leg_df):
+def test_eod_fallback_to_raw_sum(freeze, dummy_client, sample_leg_df):
     """
     EOD with no P/L analysis => fallback to raw_sum*100.
     """
-    legs = sample_leg_df
-    # stub legs, upd legs, empty pl_df, upd recs
+    legs = with_eod_info(sample_leg_df)
+    # stub legs (no P/L analysis row joined), merge legs, merge recs
     dummy_client.query.side_effect = [
-        MagicMock(to_dataframe=MagicMock(return_value=legs)),
-        MagicMock(),
-        MagicMock(to_dataframe=MagicMock(return_value=pd.DataFrame())),
-        MagicMock(),
+        qresult(legs),
+        qresult(),
+        qresult(),
     ]
-    fixed = datetime(2025, 5, 10, 20, 2, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 20, 2, tzinfo=timezone.utc))
 
     # supply mid_map for one leg: pts = entry_price->mid diff = +1
-    mid_maps = {sample_leg_df.iloc[0]["expiration_date"]: {(100.0, "call"): 6.0}}
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 6.0}}
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 100.0}, mid_maps=mid_maps)
 
-    rec = [c for c in dummy_client.query.call_args_list if "trade_recommendations" in c[0][0]][-1]
-    params = {p.name: p.value for p in rec[1]["job_config"].query_parameters}
+    (params,) = rec_updates(dummy_client)
     # raw_pnl = 6-5=1 pts => *100 =100
     assert params["pnl"] == 100.0 and params["status"] == "closed"
 
@@ -258,87 +270,54 @@ def test_eod_fallback_to_raw_sum(monkeypatch, dummy_client, sample_leg_df):
 # ---------- EOD time boundary ----------
 
 
-def test_eod_time_boundary(monkeypatch, dummy_client, sample_leg_df):
+@pytest.mark.parametrize("minute, expected", [(4, "closed"), (5, "open")])
+def test_eod_time_boundary(freeze, dummy_client, sample_leg_df, minute, expected):
     """
     16:04 ET = closed; 16:05 ET = intraday-open
     """
-    # Pre-define P/L analysis DataFrames for EOD stub
-    pl_df = pd.DataFrame([{"max_profit": 10.0, "max_loss": -20.0}])
-    info_df = pd.DataFrame(
-        [
-            {"direction": "short", "leg_type": "put", "strike": 95.0},
-            {"direction": "short", "leg_type": "call", "strike": 105.0},
-        ]
-    )
+    legs = sample_leg_df
+    if expected == "closed":
+        # EOD legs come back with their P/L analysis joined
+        legs = with_eod_info(sample_leg_df, 10.0, -20.0, short_put=95.0, short_call=105.0)
+    dummy_client.query.return_value = qresult(legs)
+    # Freeze time: ET 16:minute -> UTC 20:minute
+    freeze(datetime(2025, 5, 10, 20, minute, tzinfo=timezone.utc))
+
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 7.0}}
+    pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
 
-    for minute, expected in [(4, "closed"), (5, "open")]:
-        # Reset mocks
-        dummy_client.insert_rows_json.reset_mock()
-        dummy_client.query.reset_mock()
-        dummy_client.query.side_effect = None
-        dummy_client.query.return_value = MagicMock(
-            to_dataframe=MagicMock(return_value=sample_leg_df)
-        )
-
-        if expected == "closed":
-            # For EOD path, override query to stub the sequence of calls
-            dummy_client.query.side_effect = [
-                MagicMock(to_dataframe=MagicMock(return_value=sample_leg_df)),  # select legs
-                MagicMock(),  # update trade_legs
-                MagicMock(to_dataframe=MagicMock(return_value=pl_df)),  # pl_analysis
-                MagicMock(to_dataframe=MagicMock(return_value=info_df)),  # strike info
-                MagicMock(),  # update trade_recommendations
-            ]
-        # Freeze time: ET 16:minute -> UTC 20:minute
-        fixed = datetime(2025, 5, 10, 20, minute, tzinfo=timezone.utc)
-
-        class DT(datetime):
-            @classmethod
-            def now(cls, tz=None):
-                return fixed
-
-        monkeypatch.setattr(pnl_monitor, "datetime", DT)
-
-        mid_maps = {sample_leg_df.iloc[0]["expiration_date"]: {(100.0, "call"): 7.0}}
-        pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
-
-        # Check status in the live snapshot
-        _, rows = dummy_client.insert_rows_json.call_args[0]
-        assert rows[0]["status"] == expected, f"Minute {minute}: expected status {expected}"
-        assert dummy_client.query.called
+    # Check status in the live snapshot
+    _, rows = dummy_client.insert_rows_json.call_args[0]
+    assert rows[0]["status"] == expected, f"Minute {minute}: expected status {expected}"
+    assert dummy_client.query.called
 
 
 # Iron condor: four-leg intraday
+@pytest.fixture(scope="session")
+def _iron_condor_df_base():
+    """Four open legs of one iron condor, built once per session; see iron_condor_df."""
+    return pd.DataFrame(
+        {
+            "trade_id": ["T1"] * 4,
+            "leg_id": ["L1", "L2", "L3", "L4"],
+            "strike": [5725.0, 5715.0, 5615.0, 5605.0],
+            "leg_type": ["call", "call", "put", "put"],
+            "direction": ["long", "short", "short", "long"],
+            "entry_price": [0.425, 0.575, 2.575, 1.700],
+            "expiration_date": [SAMPLE_EXP] * 4,
+        }
+    )
+
+
 @pytest.fixture
-def iron_condor_df():
-    legs = []
-    for leg_id, leg in enumerate(
-        [
-            (5725.0, "call", "long", 0.425),
-            (5715.0, "call", "short", 0.575),
-            (5615.0, "put", "short", 2.575),
-            (5605.0, "put", "long", 1.700),
-        ],
-        start=1,
-    ):
-        legs.append(
-            {
-                "trade_id": "T1",
-                "leg_id": f"L{leg_id}",
-                "strike": leg[0],
-                "leg_type": leg[1],
-                "direction": leg[2],
-                "entry_price": leg[3],
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
-            }
-        )
-    return pd.DataFrame(legs)
-
-
-def test_iron_condor_intraday_rollup(monkeypatch, dummy_client, iron_condor_df):
+def iron_condor_df(_iron_condor_df_base):
+    """Four open legs of one iron condor (a per-test copy, safe to mutate)."""
+    return _iron_condor_df_base.copy()
+
+
+def test_iron_condor_intraday_rollup(freeze, dummy_client, iron_condor_df):
     dummy_client.query.return_value.to_dataframe.return_value = iron_condor_df
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-    monkeypatch.setattr(pnl_monitor, "datetime", DummyDateTimeFactory(fixed)(datetime))
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
     # Define current mid prices to yield known PnL:
     # long call: current=0.5 => +0.075 pts; short call curr=0.4 => +0.175; short put curr=2.6=>-0.025; long put curr=1.65=>-0.05
     mids = {
@@ -347,116 +326,112 @@ def test_iron_condor_intraday_rollup(monkeypatch, dummy_client, iron_condor_df):
         (5615.0, "put"): 2.600,
         (5605.0, "put"): 1.650,
     }
-    mid_maps = {pd.Timestamp("2025-05-15").date(): mids}
+    mid_maps = {SAMPLE_EXP: mids}
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 5700}, mid_maps=mid_maps)
-    # Assert each leg snapshot PnL in points
-    _, rows = dummy_client.insert_rows_json.call_args_list[0][0]  # first call
+    # Assert each leg snapshot PnL in points, all four in a single insert
+    dummy_client.insert_rows_json.assert_called_once()
+    _, rows = dummy_client.insert_rows_json.call_args[0]
+    assert len(rows) == 4
     raw_pts = [row["theoretical_pnl"] for row in rows]
     expected = [0.075, 0.175, -0.025, -0.05]
     for got, exp in zip(raw_pts, expected):
         assert pytest.approx(exp, rel=1e-6) == got
     # Assert total rolled-up PnL in dollars
-    rec = [c for c in dummy_client.query.call_args_list if "trade_recommendations" in c[0][0]][-1]
-    params = {p.name: p.value for p in rec[1]["job_config"].query_parameters}
+    (params,) = rec_updates(dummy_client)
     total_pts = sum(expected)
     assert params["pnl"] == pytest.approx(total_pts * 100)
     assert params["status"] == "active"
 
 
-def test_trade_legs_update_intraday_params(monkeypatch, dummy_client, sample_leg_df):
+def test_trade_legs_update_intraday_params(freeze, dummy_client, sample_leg_df):
     """
-    Intraday: ensure the UPDATE on trade_legs uses status='open',
-    includes 'pnl = @pnl', and that parameters include leg_id, pnl, cp, ts.
+    Intraday: ensure the MERGE on trade_legs uses status='open',
+    sets 'pnl = S.pnl', and that each row carries leg_id, pnl, cp.
     """
     # Stub the legs‑fetch to return one open leg
     dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
 
     # Freeze time to intraday (12:00 UTC -> 08:00 ET)
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
     # Provide quote and mid_map so current_price != entry_price
     quote = {"last": 110.0}
-    mid_maps = {sample_leg_df.expiration_date.iloc[0]: {(100.0, "call"): 7.0}}
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 7.0}}
 
     # Run the PnL update
     pnl_monitor.update_trade_pnl("SPX", quote=quote, mid_maps=mid_maps)
 
-    # Find the trade_legs UPDATE call
-    update_calls = [
+    # Find the trade_legs MERGE call
+    merge_calls = [
         (args, kw)
         for args, kw in dummy_client.query.call_args_list
-        if args and "UPDATE `" in args[0] and pnl_monitor.TRADE_LEGS in args[0]
+        if args and "MERGE `" in args[0] and pnl_monitor.TRADE_LEGS in args[0]
     ]
-    assert update_calls, "Expected an UPDATE on trade_legs"
-    args, kwargs = update_calls[0]
-    sql_text = args[0]
+    assert len(merge_calls) == 1, "Expected a single MERGE on trade_legs"
+    sql_text = merge_calls[0][0][0]
 
-    # a) SQL must set pnl and status='open'
-    assert "pnl = @pnl" in sql_text, "Intraday UPDATE did not set pnl = @pnl"
-    assert "status = 'open'" in sql_text, "Intraday UPDATE did not set status='open'"
+    # a) SQL must set pnl and status='open', and leave exit columns alone
+    assert "pnl = S.pnl" in sql_text, "Intraday MERGE did not set pnl = S.pnl"
+    assert "status = 'open'" in sql_text, "Intraday MERGE did not set status='open'"
+    assert "exit_price" not in sql_text
+    assert query_param(merge_calls[0], "ts") is None
 
-    # b) Parameters must include leg_id, pnl, cp, ts (ts now a datetime)
-    params = {p.name: p.value for p in kwargs["job_config"].query_parameters}
+    # b) The leg's row must carry leg_id, pnl, cp
+    (params,) = merge_rows(merge_calls[0])
     assert params["leg_id"] == sample_leg_df.leg_id.iloc[0]
     assert params["pnl"] == pytest.approx(2.0)  # (7 - 5)
     assert params["cp"] == pytest.approx(7.0)
-    assert "ts" in params and isinstance(params["ts"], datetime)
 
 
-def test_trade_legs_update_eod_params(monkeypatch, dummy_client, sample_leg_df):
+def test_trade_legs_update_eod_params(freeze, dummy_client, sample_leg_df):
     """
-    EOD: at exactly 16:00 ET, UPDATE on trade_legs should use status='closed',
-    include exit_price=@cp & exit_time=@ts, and parameters include cp and ts.
+    EOD: at exactly 16:00 ET, MERGE on trade_legs should use status='closed',
+    include exit_price=S.cp & exit_time=@ts, and parameters include cp and ts.
     """
-    # Stub sequence: fetch legs, update legs, pl_analysis, info_df, update recs
-    pl_df = pd.DataFrame([{"max_profit": 100.0, "max_loss": -50.0}])
-    info_df = pd.DataFrame(
-        [
-            {"direction": "short", "leg_type": "put", "strike": 95.0},
-            {"direction": "short", "leg_type": "call", "strike": 105.0},
-        ]
-    )
+    # Stub sequence: fetch legs (with P/L analysis), merge legs, merge recs
+    legs = with_eod_info(sample_leg_df, 100.0, -50.0, short_put=95.0, short_call=105.0)
     dummy_client.query.side_effect = [
-        MagicMock(to_dataframe=MagicMock(return_value=sample_leg_df)),  # fetch legs
-        MagicMock(),  # update legs
-        MagicMock(to_dataframe=MagicMock(return_value=pl_df)),  # pl_analysis
-        MagicMock(to_dataframe=MagicMock(return_value=info_df)),  # strike info
-        MagicMock(),  # update recs
+        qresult(legs),  # fetch legs
+        qresult(),  # merge legs
+        qresult(),  # merge recs
     ]
 
     # Freeze time to 20:00 UTC => 16:00 ET
-    fixed = datetime(2025, 5, 10, 20, 0, tzinfo=timezone.utc)
+    freeze(datetime(2025, 5, 10, 20, 0, tzinfo=timezone.utc))
 
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
+    pnl_monitor.update_trade_pnl("SPX", quote={"last": 100.0}, mid_maps={})
 
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    # The second call in side_effect is the trade_legs MERGE
+    call = dummy_client.query.call_args_list[1]
+    sql_text = call[0][0]
+    assert pnl_monitor.TRADE_LEGS in sql_text, "EOD MERGE did not target TRADE_LEGS"
+    assert "exit_price = S.cp" in sql_text, "EOD MERGE missing exit_price = S.cp"
+    assert "exit_time = @ts" in sql_text, "EOD MERGE missing exit_time = @ts"
+    assert "status = 'closed'" in sql_text, "EOD MERGE missing status='closed'"
 
-    pnl_monitor.update_trade_pnl("SPX", quote={"last": 100.0}, mid_maps={})
+    (row,) = merge_rows(call)
+    assert row["cp"] == pytest.approx(0.0)  # no mid => fallback 0.0
+    assert query_param(call, "ts") is not None
+
+
+def test_unexpected_direction_priced_as_long(freeze, dummy_client, sample_leg_df):
+    """
+    A direction other than exactly "short" (casing, None, ...) is priced as long, never NaN.
+    """
+    legs = pd.concat([sample_leg_df] * 3, ignore_index=True).assign(
+        leg_id=["L1", "L2", "L3"], direction=["Long", None, " short"]
+    )
+    dummy_client.query.return_value.to_dataframe.return_value = legs
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
-    # The second call in side_effect is the trade_legs UPDATE
-    args, kwargs = dummy_client.query.call_args_list[1]
-    sql_text = args[0]
-    assert pnl_monitor.TRADE_LEGS in sql_text, "EOD UPDATE did not target TRADE_LEGS"
-    assert "exit_price = @cp" in sql_text, "EOD UPDATE missing exit_price = @cp"
-    assert "exit_time = @ts" in sql_text, "EOD UPDATE missing exit_time = @ts"
-    assert "status = 'closed'" in sql_text, "EOD UPDATE missing status='closed'"
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 7.0}}
+    pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
 
-    params = {p.name: p.value for p in kwargs["job_config"].query_parameters}
-    assert params["cp"] == pytest.approx(0.0)  # no mid => fallback 0.0
-    assert "ts" in params
+    _, rows = dummy_client.insert_rows_json.call_args[0]
+    assert [r["theoretical_pnl"] for r in rows] == [2.0, 2.0, 2.0]
 
 
-def test_live_snapshot_full_payload(monkeypatch, dummy_client, sample_leg_df):
+def test_live_snapshot_full_payload(freeze, dummy_client, sample_leg_df):
     """
     Intraday snapshot: verify insert_rows_json payload has keys
     'current_price', 'underlying_price', and 'price_type' == 'mid'.
@@ -464,17 +439,10 @@ def test_live_snapshot_full_payload(monkeypatch, dummy_client, sample_leg_df):
     dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
 
     # Freeze intraday
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
     quote = {"last": 110.0}
-    mid_maps = {sample_leg_df.expiration_date.iloc[0]: {(100.0, "call"): 7.0}}
+    mid_maps = {SAMPLE_EXP: {(100.0, "call"): 7.0}}
     pnl_monitor.update_trade_pnl("SPX", quote=quote, mid_maps=mid_maps)
 
     # inspect the single insert_rows_json call
@@ -485,9 +453,9 @@ def test_live_snapshot_full_payload(monkeypatch, dummy_client, sample_leg_df):
     assert payload["price_type"] == "mid"
 
 
-def test_multiple_trade_rollup(monkeypatch, dummy_client):
+def test_multiple_trade_rollup(freeze, dummy_client):
     """
-    Two different trade_ids => two separate rec-updates, each with correct PnL.
+    Two different trade_ids => one rec-MERGE with a row per trade, each with correct PnL.
     """
     # Prepare two legs for two trades
     df = pd.DataFrame(
@@ -499,7 +467,7 @@ def test_multiple_trade_rollup(monkeypatch, dummy_client):
                 "leg_type": "call",
                 "direction": "long",
                 "entry_price": 5.0,
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
+                "expiration_date": SAMPLE_EXP,
             },
             {
                 "trade_id": "T2",
@@ -508,87 +476,63 @@ def test_multiple_trade_rollup(monkeypatch, dummy_client):
                 "leg_type": "put",
                 "direction": "long",
                 "entry_price": 2.0,
-                "expiration_date": pd.Timestamp("2025-05-15").date(),
+                "expiration_date": SAMPLE_EXP,
             },
         ]
     )
     dummy_client.query.return_value.to_dataframe.return_value = df
 
     # Freeze intraday
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
     # mid_maps with +1 pt for each leg
     mid_maps = {
-        pd.Timestamp("2025-05-15").date(): {
+        SAMPLE_EXP: {
             (100.0, "call"): 6.0,  # +1 => $100
             (50.0, "put"): 3.0,  # +1 => $100
         }
     }
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 110.0}, mid_maps=mid_maps)
 
-    # Filter only UPDATE calls on trade_recommendations
+    # Filter only MERGE calls on trade_recommendations
     rec_calls = [
         (args, kw)
         for args, kw in dummy_client.query.call_args_list
-        if args and "UPDATE" in args[0] and pnl_monitor.TRADE_RECS in args[0]
+        if args and "MERGE" in args[0] and pnl_monitor.TRADE_RECS in args[0]
     ]
-    assert len(rec_calls) == 2, f"Expected 2 rec-updates, got {len(rec_calls)}"
+    assert len(rec_calls) == 1, f"Expected 1 rec-MERGE, got {len(rec_calls)}"
 
-    pnls = [
-        {p.name: p.value for p in kw["job_config"].query_parameters}["pnl"]
-        for args, kw in rec_calls
-    ]
-    assert all(p == pytest.approx(100.0) for p in pnls)
+    rows = merge_rows(rec_calls[0])
+    assert [r["trade_id"] for r in rows] == ["T1", "T2"]
+    assert all(r["pnl"] == pytest.approx(100.0) for r in rows)
 
 
-def test_insert_rows_exception_propagation(monkeypatch, dummy_client, sample_leg_df):
+def test_insert_rows_exception_propagation(freeze, dummy_client, sample_leg_df):
     """
     If insert_rows_json fails, the exception should bubble up.
     """
     dummy_client.query.return_value.to_dataframe.return_value = sample_leg_df
     dummy_client.insert_rows_json.side_effect = ValueError("DB error")
 
-    fixed = datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 12, 0, tzinfo=timezone.utc))
 
     with pytest.raises(ValueError, match="DB error"):
         pnl_monitor.update_trade_pnl("SPX", quote={"last": 100}, mid_maps={})
 
 
-def test_eod_exact_1600_boundary(monkeypatch, dummy_client, sample_leg_df):
+def test_eod_exact_1600_boundary(freeze, dummy_client, sample_leg_df):
     """
     Exactly 16:00:00 ET should be treated as EOD (snapshot status closed).
     """
-    # Stub legs + pl_analysis empty so fallback taken
+    # Stub legs with no pl_analysis row joined so fallback taken
     dummy_client.query.side_effect = [
-        MagicMock(to_dataframe=MagicMock(return_value=sample_leg_df)),  # legs
-        MagicMock(),  # update legs
-        MagicMock(to_dataframe=MagicMock(return_value=pd.DataFrame())),  # empty pl_analysis
-        MagicMock(),  # update recs
+        qresult(with_eod_info(sample_leg_df)),  # legs
+        qresult(),  # merge legs
+        qresult(),  # merge recs
     ]
 
     # Freeze to 20:00 UTC = 16:00 ET
-    fixed = datetime(2025, 5, 10, 20, 0, tzinfo=timezone.utc)
-
-    class DT(datetime):
-        @classmethod
-        def now(cls, tz=None):
-            return fixed
-
-    monkeypatch.setattr(pnl_monitor, "datetime", DT)
+    freeze(datetime(2025, 5, 10, 20, 0, tzinfo=timezone.utc))
 
     pnl_monitor.update_trade_pnl("SPX", quote={"last": 100.0}, mid_maps={})
 
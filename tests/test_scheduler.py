@@ -0,0 +1,62 @@
+# test_scheduler.py
+
+from datetime import datetime
+
+import pytest
+
+from analytics import gex_calculator, realized_vol
+from fetcher import scheduler
+
+
+@pytest.fixture
+def eod_tick(monkeypatch):
+    """A 16:00 ET tick that starts at 16:00:15, inside market hours."""
+    start = datetime(2025, 5, 12, 16, 0, 15, tzinfo=scheduler.NY_TZ)
+
+    class DT(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return start
+
+    monkeypatch.setattr(scheduler, "datetime", DT)
+    monkeypatch.setattr(scheduler, "is_trading_hours", lambda: True)
+
+
+def test_slow_eod_tick_still_runs_analytics(monkeypatch, eod_tick):
+    """
+    A 16:00 tick whose market-data fetch ends after 16:00:59 (when is_trading_hours()
+    turns False) must still run the EOD GEX and realized-vol jobs.
+    """
+
+    def slow_market_data(force=False):
+        # by the time the fetch returns, the analytics' own guards would see 16:01
+        monkeypatch.setattr(gex_calculator, "is_trading_hours", lambda: False)
+        monkeypatch.setattr(realized_vol, "is_trading_hours", lambda: False)
+
+    ran = []
+
+    def fake_client(name):
+        def get_client():
+            ran.append(name)
+            raise RuntimeError("stop here")  # logged by the job's own handler
+
+        return get_client
+
+    monkeypatch.setattr(scheduler, "scheduled_market_data", slow_market_data)
+    monkeypatch.setattr(gex_calculator, "get_bq_client", fake_client("gex"))
+    monkeypatch.setattr(realized_vol, "get_bq_client", fake_client("realized_vol"))
+
+    scheduler.market_tick()
+
+    assert ran == ["gex", "realized_vol"]
+
+
+def test_analytics_still_guard_market_hours_by_default(monkeypatch):
+    """Called on their own, the analytics jobs keep skipping outside market hours."""
+    monkeypatch.setattr(gex_calculator, "is_trading_hours", lambda: False)
+    monkeypatch.setattr(realized_vol, "is_trading_hours", lambda: False)
+    monkeypatch.setattr(gex_calculator, "get_bq_client", pytest.fail)
+    monkeypatch.setattr(realized_vol, "get_bq_client", pytest.fail)
+
+    gex_calculator.calculate_and_store_gex()
+    realized_vol.calculate_and_store_realized_vol()
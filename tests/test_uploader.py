@@ -1,6 +1,6 @@
 # test_uploader.py
 
-from datetime import datetime
+from datetime import date, datetime
 from unittest.mock import patch
 
 import pandas as pd
@@ -9,8 +9,8 @@ import pytest
 from fetcher import uploader
 
 
-@patch("app.uploader.to_gbq")
-def test_upload_to_bigquery(mock_to_gbq):
+@patch("fetcher.uploader.get_bq_client")
+def test_upload_to_bigquery(mock_get_client):
     options = [
         {
             "symbol": "SPX240503P05000000",
@@ -51,15 +51,39 @@ def test_upload_to_bigquery(mock_to_gbq):
 
     uploader.upload_to_bigquery(options, timestamp, expiration, underlying_price)
 
-    mock_to_gbq.assert_called_once()
-    df_arg = mock_to_gbq.call_args[0][0]
+    load = mock_get_client.return_value.load_table_from_dataframe
+    load.assert_called_once()
+    df_arg = load.call_args[0][0]
     assert isinstance(df_arg, pd.DataFrame)
     assert df_arg.iloc[0]["symbol"] == "SPX240503P05000000"
     assert df_arg.iloc[0]["underlying_price"] == 5050.0
+    assert df_arg.iloc[0]["expiration_date"] == date(2024, 5, 3)
 
 
-@patch("app.uploader.to_gbq")
-def test_upload_index_price(mock_to_gbq):
+@patch("fetcher.uploader.get_bq_client")
+def test_upload_option_columns_single_load(mock_get_client):
+    timestamp = datetime.utcnow()
+    underlying_price = {"last": 5050.0}
+    columns = None
+    for expiration in ["2024-05-03", "2024-05-10"]:
+        chain = [
+            {"symbol": f"SPX-{expiration}-{t}", "expiration_date": expiration, "option_type": t}
+            for t in ("call", "put")
+        ]
+        columns = uploader.build_option_columns(chain, timestamp, underlying_price, columns)
+
+    uploader.upload_option_columns(columns, "2 option chains")
+
+    load = mock_get_client.return_value.load_table_from_dataframe
+    load.assert_called_once()
+    df_arg = load.call_args[0][0]
+    assert len(df_arg) == 4
+    assert set(df_arg["expiration_date"]) == {date(2024, 5, 3), date(2024, 5, 10)}
+    assert (df_arg["underlying_price"] == 5050.0).all()
+
+
+@patch("fetcher.uploader.get_bq_client")
+def test_upload_index_price(mock_get_client):
     quote = {
         "last": 5050.0,
         "high": 5060.0,
@@ -69,10 +93,25 @@ def test_upload_index_price(mock_to_gbq):
         "volume": 123456,
     }
 
+    insert = mock_get_client.return_value.insert_rows_json
+    insert.return_value = []
+
     uploader.upload_index_price("SPX", quote)
 
-    mock_to_gbq.assert_called_once()
-    df_arg = mock_to_gbq.call_args[0][0]
-    assert isinstance(df_arg, pd.DataFrame)
-    assert df_arg.iloc[0]["symbol"] == "SPX"
-    assert df_arg.iloc[0]["last"] == 5050.0
+    insert.assert_called_once()
+    (row,) = insert.call_args[0][1]
+    assert row["symbol"] == "SPX"
+    assert row["last"] == 5050.0
+    assert datetime.fromisoformat(row["timestamp"]).tzinfo is not None
+
+
+@patch("fetcher.uploader.get_bq_client")
+def test_upload_index_prices_single_insert(mock_get_client):
+    insert = mock_get_client.return_value.insert_rows_json
+    insert.return_value = []
+
+    uploader.upload_index_prices({"SPX": {"last": 5050.0}, "SPY": {"last": 505.0}, "QQQ": {}})
+
+    insert.assert_called_once()
+    rows = insert.call_args[0][1]
+    assert [(row["symbol"], row["last"]) for row in rows] == [("SPX", 5050.0), ("SPY", 505.0)]
@@ -12,10 +12,9 @@ from typing import Optional
 import numpy as np
 import pandas as pd
 import pytz
-from google.cloud import bigquery
 from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
 
-from common.auth import get_gcp_credentials
+from common.bq_client import get_bq_client
 from common.config import GOOGLE_CLOUD_PROJECT
 
 # ── Table names ───────────────────────────────────────────────────────────────
@@ -26,10 +25,7 @@ TRADE_PL_ANALYSIS_TABLE = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_pl_analysis"
 INDEX_PRICE_TABLE = f"{GOOGLE_CLOUD_PROJECT}.market_data.index_price_snapshot"
 
 # ── BigQuery client ───────────────────────────────────────────────────────────
-CLIENT = bigquery.Client(
-    credentials=get_gcp_credentials(),
-    project=GOOGLE_CLOUD_PROJECT,
-)
+CLIENT = get_bq_client()
 
 
 def norm_cdf(x: float) -> float:
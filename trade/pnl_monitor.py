@@ -6,13 +6,20 @@
 
 import logging
 from datetime import datetime, timezone
-from typing import Dict, Tuple
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo
 
-import pytz
-from google.cloud import bigquery
-from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
+import numpy as np
+import pandas as pd
+from google.cloud.bigquery import (
+    ArrayQueryParameter,
+    QueryJobConfig,
+    ScalarQueryParameter,
+    StructQueryParameter,
+)
 
-from common.auth import get_gcp_credentials
+from common.bq_client import get_bq_client
 from common.config import GOOGLE_CLOUD_PROJECT
 
 # ── BigQuery table identifiers ──────────────────────────────────────────────
@@ -22,13 +29,110 @@ LIVE_PNL = f"{GOOGLE_CLOUD_PROJECT}.analytics.live_trade_pnl"
 PL_ANALYSIS = f"{GOOGLE_CLOUD_PROJECT}.analytics.trade_pl_analysis"
 
 # ── One shared BigQuery client for all operations ────────────────────────────
-CLIENT = bigquery.Client(
-    credentials=get_gcp_credentials(),
-    project=GOOGLE_CLOUD_PROJECT,
-)
+CLIENT = get_bq_client()
 
 # ── Use same timezone for EOD detection ──────────────────────────────────────
-NY_TZ = pytz.timezone("America/New_York")
+NY_TZ = ZoneInfo("America/New_York")
+
+
+# ── SQL, built once at import; keyed by is_eod where the EOD close differs ──
+_OPEN_LEGS_CTE = f"""
+    WITH legs AS (
+      SELECT
+        t.trade_id,
+        t.leg_id,
+        t.strike,
+        t.leg_type,
+        t.direction,
+        t.entry_price,
+        r.expiration_date
+      FROM `{TRADE_LEGS}` AS t
+      JOIN `{TRADE_RECS}` AS r USING(trade_id)
+      WHERE t.status = 'open'
+        AND r.symbol = @symbol
+    )
+    """
+
+OPEN_LEGS_SQL = {
+    False: _OPEN_LEGS_CTE + "SELECT * FROM legs",
+    # the final payoff needs each trade's latest analytic P/L bounds and its two
+    # short strikes: fetch them alongside the legs, in the same job
+    True: _OPEN_LEGS_CTE
+    + f"""
+    , pl AS (
+      SELECT trade_id, max_profit, max_loss
+      FROM `{PL_ANALYSIS}`
+      WHERE trade_id IN (SELECT trade_id FROM legs)
+      QUALIFY ROW_NUMBER() OVER (PARTITION BY trade_id ORDER BY timestamp DESC) = 1
+    ), shorts AS (
+      SELECT
+        trade_id,
+        MIN(IF(leg_type = 'put', strike, NULL))  AS short_put,
+        MIN(IF(leg_type = 'call', strike, NULL)) AS short_call
+      FROM `{TRADE_LEGS}`
+      WHERE direction = 'short'
+        AND trade_id IN (SELECT trade_id FROM legs)
+      GROUP BY trade_id
+    )
+    SELECT *
+    FROM legs
+    LEFT JOIN pl USING(trade_id)
+    LEFT JOIN shorts USING(trade_id)
+    """,
+}
+
+MERGE_LEGS_SQL = {
+    is_eod: f"""
+        MERGE `{TRADE_LEGS}` T
+        USING UNNEST(@rows) S
+        ON T.leg_id = S.leg_id
+        WHEN MATCHED THEN UPDATE SET {set_clauses}
+        """
+    for is_eod, set_clauses in [
+        (False, "pnl = S.pnl, status = 'open'"),
+        (True, "pnl = S.pnl, status = 'closed', exit_price = S.cp, exit_time = @ts"),
+    ]
+}
+
+MERGE_RECS_SQL = {
+    is_eod: f"""
+        MERGE `{TRADE_RECS}` T
+        USING UNNEST(@rows) S
+        ON T.trade_id = S.trade_id
+        WHEN MATCHED AND T.status != 'closed' THEN UPDATE SET
+          pnl        = S.pnl,
+          status     = S.status,
+          exit_price = {exit_price},
+          exit_time  = {exit_time}
+        """
+    for is_eod, exit_price, exit_time in [
+        (False, "T.exit_price", "T.exit_time"),
+        (True, "@cp", "@ts"),
+    ]
+}
+
+
+@lru_cache(maxsize=None)
+def _is_eod(hour: int, minute: int) -> bool:
+    """True inside the 16:00–16:04 ET close window, when positions are finalised."""
+    return hour == 16 and minute < 5
+
+
+def _struct_rows(name: str, fields: Dict[str, str], rows: List[tuple]) -> ArrayQueryParameter:
+    """
+    ARRAY<STRUCT> query parameter with one STRUCT per row, for `MERGE ... USING UNNEST(@name)`.
+    `fields` maps each struct field name to its BigQuery type, in row-tuple order.
+    """
+    return ArrayQueryParameter(
+        name,
+        "STRUCT",
+        [
+            StructQueryParameter(
+                None, *(ScalarQueryParameter(f, t, v) for (f, t), v in zip(fields.items(), row))
+            )
+            for row in rows
+        ],
+    )
 
 
 def update_trade_pnl(symbol: str, quote: dict, mid_maps: Dict[str, Dict[Tuple[float, str], float]]):
@@ -38,7 +142,8 @@ def update_trade_pnl(symbol: str, quote: dict, mid_maps: Dict[str, Dict[Tuple[fl
     Args:
       symbol    (str): Underlying ticker, e.g. "SPX" or "QQQ".
       quote     (dict): Latest underlying quote; must include key 'last' for price.
-      mid_maps  (dict): Per‐expiry lookup of {(strike, option_type): mid_price}.
+      mid_maps  (dict): Per-expiry lookup of {(strike, option_type): mid_price};
+                        expiries may be dates or "YYYY-MM-DD" strings.
 
     Behavior:
       - Runs every 5 min; does intraday marking (“active” status).
@@ -48,26 +153,18 @@ def update_trade_pnl(symbol: str, quote: dict, mid_maps: Dict[str, Dict[Tuple[fl
     # ── 0) Get timestamps & detect EOD window. ───────────────────────────────
     now_utc = datetime.now(timezone.utc)
     now_et = now_utc.astimezone(NY_TZ)
-    is_eod = now_et.hour == 16 and now_et.minute < 5
+    is_eod = _is_eod(now_et.hour, now_et.minute)
     now_iso = now_utc.isoformat()  # for TIMESTAMP params
 
-    # ── 1) Fetch all currently open legs for this symbol ─────────────────────
-    legs_sql = f"""
-    SELECT
-      t.trade_id,
-      t.leg_id,
-      t.strike,
-      t.leg_type,
-      t.direction,
-      t.entry_price,
-      r.expiration_date
-    FROM `{TRADE_LEGS}` AS t
-    JOIN `{TRADE_RECS}` AS r USING(trade_id)
-    WHERE t.status = 'open'
-      AND r.symbol = @symbol
-    """
+    # ── 1) Validate underlying quote (before spending a query on the legs) ──
+    if not quote or "last" not in quote:
+        logging.warning("[%s] Missing underlying quote; skipping PnL update.", symbol)
+        return
+    underlying_price = float(quote["last"])
+
+    # ── 2) Fetch all currently open legs for this symbol ─────────────────────
     legs_df = CLIENT.query(
-        legs_sql,
+        OPEN_LEGS_SQL[is_eod],
         job_config=QueryJobConfig(
             query_parameters=[ScalarQueryParameter("symbol", "STRING", symbol)]
         ),
@@ -78,116 +175,102 @@ def update_trade_pnl(symbol: str, quote: dict, mid_maps: Dict[str, Dict[Tuple[fl
         logging.info("[%s] No open legs to process.", symbol)
         return
 
-    # ── 2) Validate underlying quote ───────────────────────────────────────
-    if not quote or "last" not in quote:
-        logging.warning("[%s] Missing underlying quote; skipping PnL update.", symbol)
-        return
-    underlying_price = float(quote["last"])
+    # ── 3) Price every leg at once: current mid (or fallback) and raw PnL ────
+    entry = legs_df["entry_price"].to_numpy(dtype=float)
+    # a) flatten mid_maps to {(expiry, strike, type): mid} for one lookup per leg;
+    #    expiries are keyed as ISO strings so the scheduler's "YYYY-MM-DD" keys
+    #    and BigQuery DATE values line up
+    flat_mids = {
+        (str(exp_date), strike, leg_type): mid
+        for exp_date, mids in mid_maps.items()
+        for (strike, leg_type), mid in mids.items()
+    }
+    #    at EOD, any missing mid means OTM → price = 0.0;
+    #    intraday, missing mid => assume price = entry
+    fallback = np.zeros_like(entry) if is_eod else entry
+    current = np.array(
+        [
+            flat_mids.get(key, fb)
+            for key, fb in zip(
+                zip(
+                    legs_df["expiration_date"].astype(str),
+                    legs_df["strike"],
+                    legs_df["leg_type"],
+                ),
+                fallback,
+            )
+        ],
+        dtype=float,
+    )
 
-    # prepare accumulator for per-trade PnL in index points
-    trade_totals: Dict[str, float] = {}
+    # b) raw PnL in index points
+    #   short position: entry_price - current_price
+    #   long  position: current_price - entry_price
+    #   (anything but "short" is treated as long, so a bad value never yields NaN)
+    sign = np.where(legs_df["direction"].to_numpy() == "short", -1.0, 1.0)
+    raw = sign * (current - entry)
 
-    # ── 3) Loop each leg: compute PnL, write snapshot, update leg table ────
-    for _, leg in legs_df.iterrows():
-        exp_date = leg.expiration_date
-        # a) choose current mid price or fallback
-        per_map = mid_maps.get(exp_date, {})
-        if is_eod:
-            # at EOD, any missing mid means OTM → price = 0.0
-            current_price = per_map.get((leg.strike, leg.leg_type), 0.0)
-        else:
-            # intraday, missing mid => assume price = entry
-            current_price = per_map.get((leg.strike, leg.leg_type), leg.entry_price)
-
-        # b) raw PnL in index points
-        #   short position: entry_price - current_price
-        #   long  position: current_price - entry_price
-        raw_pts = (
-            leg.entry_price - current_price
-            if leg.direction == "short"
-            else current_price - leg.entry_price
-        )
-        raw_pts = float(raw_pts)
-
-        # c) write a snapshot to live_trade_pnl
-        CLIENT.insert_rows_json(
-            LIVE_PNL,
-            [
-                {
-                    "trade_id": leg.trade_id,
-                    "leg_id": leg.leg_id,
-                    "timestamp": now_iso,
-                    "current_price": current_price,
-                    "theoretical_pnl": raw_pts,
-                    "mark_price": current_price,
-                    "underlying_price": underlying_price,
-                    "price_type": "mid",
-                    "underlying_symbol": symbol,
-                    "status": "closed" if is_eod else "open",
-                }
-            ],
-        )
+    # per-trade PnL in index points, in first-seen trade order
+    trade_totals: Dict[str, float] = (
+        pd.Series(raw).groupby(legs_df["trade_id"].to_numpy(), sort=False).sum().to_dict()
+    )
 
-        # d) update this leg’s row in trade_legs
-        leg_params = [
-            ScalarQueryParameter("leg_id", "STRING", leg.leg_id),
-            ScalarQueryParameter("pnl", "FLOAT", raw_pts),
-            ScalarQueryParameter("cp", "FLOAT", current_price),
-            ScalarQueryParameter("ts", "TIMESTAMP", now_iso),
-        ]
-        set_clauses = ["pnl = @pnl", f"status = '{'closed' if is_eod else 'open'}'"]
-        if is_eod:
-            set_clauses += ["exit_price = @cp", "exit_time = @ts"]
-        CLIENT.query(
-            f"""
-            UPDATE `{TRADE_LEGS}`
-            SET {', '.join(set_clauses)}
-            WHERE leg_id = @leg_id
-            """,
-            job_config=QueryJobConfig(query_parameters=leg_params),
+    # ── 4) Write every leg's snapshot to live_trade_pnl in one streaming insert
+    snapshot_status = "closed" if is_eod else "open"
+    leg_ids = legs_df["leg_id"].tolist()
+    current_prices = current.tolist()
+    raw_pts_list = raw.tolist()
+    CLIENT.insert_rows_json(
+        LIVE_PNL,
+        [
+            {
+                "trade_id": trade_id,
+                "leg_id": leg_id,
+                "timestamp": now_iso,
+                "current_price": current_price,
+                "theoretical_pnl": raw_pts,
+                "mark_price": current_price,
+                "underlying_price": underlying_price,
+                "price_type": "mid",
+                "underlying_symbol": symbol,
+                "status": snapshot_status,
+            }
+            for trade_id, leg_id, current_price, raw_pts in zip(
+                legs_df["trade_id"], leg_ids, current_prices, raw_pts_list
+            )
+        ],
+        # one id per (leg, tick): a retried insert is de-duplicated by BigQuery
+        row_ids=[f"{leg_id}@{now_iso}" for leg_id in leg_ids],
+    )
+
+    # ── 5) Update every leg's row in trade_legs with one MERGE ───────────────
+    leg_params = [
+        _struct_rows(
+            "rows",
+            {"leg_id": "STRING", "pnl": "FLOAT64", "cp": "FLOAT64"},
+            list(zip(leg_ids, raw_pts_list, current_prices)),
         )
+    ]
+    if is_eod:
+        leg_params.append(ScalarQueryParameter("ts", "TIMESTAMP", now_iso))
+    CLIENT.query(
+        MERGE_LEGS_SQL[is_eod],
+        job_config=QueryJobConfig(query_parameters=leg_params),
+    )
 
-        # e) accumulate for trade-level roll-up
-        trade_totals[leg.trade_id] = trade_totals.get(leg.trade_id, 0.0) + raw_pts
+    # ── 6) Roll up per-trade and update trade_recommendations with one MERGE ─
+    if is_eod:
+        # P/L bounds and short strikes repeat on every leg row; keep one row per trade
+        eod_info = legs_df.drop_duplicates("trade_id").set_index("trade_id")
 
-    # ── 4) Roll up per-trade and update trade_recommendations ────────────────
+    rec_rows: List[tuple] = []
     for tid, sum_pts in trade_totals.items():
         if is_eod:
-            # try to fetch analytic bounds for final payoff
-            pl_df = CLIENT.query(
-                f"""
-                SELECT max_profit, max_loss
-                FROM `{PL_ANALYSIS}`
-                WHERE trade_id = @tid
-                ORDER BY timestamp DESC
-                LIMIT 1
-                """,
-                job_config=QueryJobConfig(
-                    query_parameters=[ScalarQueryParameter("tid", "STRING", tid)]
-                ),
-            ).to_dataframe()
-
-            if not pl_df.empty:
-                p_max = float(pl_df.at[0, "max_profit"])
-                p_min = float(pl_df.at[0, "max_loss"])
-                # fetch the two short strikes to decide payoff region
-                info_df = CLIENT.query(
-                    f"""
-                    SELECT direction, leg_type, strike
-                    FROM `{TRADE_LEGS}`
-                    WHERE trade_id = @tid
-                    """,
-                    job_config=QueryJobConfig(
-                        query_parameters=[ScalarQueryParameter("tid", "STRING", tid)]
-                    ),
-                ).to_dataframe()
-                sp = float(
-                    info_df.query("direction=='short' and leg_type=='put'")["strike"].iloc[0]
-                )
-                sc = float(
-                    info_df.query("direction=='short' and leg_type=='call'")["strike"].iloc[0]
-                )
-                final_pnl = p_max if (sp <= underlying_price <= sc) else p_min
+            info = eod_info.loc[tid]
+            if pd.notna(info["max_profit"]):
+                # max profit if the underlying settled between the short strikes
+                in_range = info["short_put"] <= underlying_price <= info["short_call"]
+                final_pnl = float(info["max_profit"] if in_range else info["max_loss"])
             else:
                 final_pnl = sum_pts * 100.0
 
@@ -197,31 +280,20 @@ def update_trade_pnl(symbol: str, quote: dict, mid_maps: Dict[str, Dict[Tuple[fl
             final_pnl = sum_pts * 100.0
             new_status = "active"
 
-        # f) update trade_recommendations with rolled-up PnL
-        rec_params = [
-            ScalarQueryParameter("tid", "STRING", tid),
-            ScalarQueryParameter("pnl", "FLOAT", final_pnl),
-            ScalarQueryParameter("status", "STRING", new_status),
+        rec_rows.append((tid, final_pnl, new_status))
+
+    # if EOD, we need @cp and @ts here too
+    rec_params = [
+        _struct_rows("rows", {"trade_id": "STRING", "pnl": "FLOAT64", "status": "STRING"}, rec_rows)
+    ]
+    if is_eod:
+        rec_params += [
+            ScalarQueryParameter("cp", "FLOAT", current_prices[-1]),
+            ScalarQueryParameter("ts", "TIMESTAMP", now_iso),
         ]
-        # if EOD, we need @cp and @ts here too
-        if is_eod:
-            rec_params += [
-                ScalarQueryParameter("cp", "FLOAT", current_price),
-                ScalarQueryParameter("ts", "TIMESTAMP", now_iso),
-            ]
-
-        CLIENT.query(
-            f"""
-            UPDATE `{TRADE_RECS}`
-            SET
-              pnl        = @pnl,
-              status     = @status,
-              exit_price = {'@cp' if is_eod else 'exit_price'},
-              exit_time  = {'@ts' if is_eod else 'exit_time'}
-            WHERE trade_id = @tid
-              AND status != 'closed'
-            """,
-            job_config=QueryJobConfig(query_parameters=rec_params),
-        )
+    CLIENT.query(
+        MERGE_RECS_SQL[is_eod],
+        job_config=QueryJobConfig(query_parameters=rec_params),
+    )
 
     logging.info("[%s] PnL monitor complete (EOD=%s)", symbol, is_eod)
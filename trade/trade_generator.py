@@ -8,10 +8,9 @@ from datetime import date, datetime, timezone
 from typing import Optional, Union
 
 import pandas as pd
-from google.cloud import bigquery
 from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
 
-from common.auth import get_gcp_credentials
+from common.bq_client import get_bq_client
 from common.config import (
     GOOGLE_CLOUD_PROJECT,
     MODEL_VERSION,
@@ -27,10 +26,7 @@ OPT_SNAP = f"{GOOGLE_CLOUD_PROJECT}.options.option_chain_snapshot"
 IDX_PRICE = f"{GOOGLE_CLOUD_PROJECT}.market_data.index_price_snapshot"
 
 # ── BigQuery client ───────────────────────────────────────────────────────────
-CLIENT = bigquery.Client(
-    credentials=get_gcp_credentials(),
-    project=GOOGLE_CLOUD_PROJECT,
-)
+CLIENT = get_bq_client()
 
 
 def _closest_strike(available: pd.Series, target: float) -> float: